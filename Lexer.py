@@ -1,5 +1,59 @@
+import codecs
+import mmap
+import re
+from bisect import bisect_left, bisect_right
+from typing import Tuple
+
+from lineindex import LineIndex
+from symbols import NO_SYMBOL, SymbolTable
+from tokenstream import SYMBOL_TYPES, TokenStream, TYPE_CODES
+
+
+KEYWORDS = frozenset({
+    'int', 'char', 'float', 'double', 'void',
+    'if', 'else', 'while', 'for', 'return',
+    'break', 'continue', 'struct', 'typedef'
+})
+
+ENGINES = ('char', 'regex', 'numpy')
+
+# Master pattern of the regex engine. Alternatives are tried in the same order
+# as the checks in CLexer._lex_token, and only cover ASCII token starts: a
+# position the pattern cannot match is handed to the character scanner.
+TOKEN_RE = re.compile(r'''
+  \s*(?:
+    (?P<PREPROCESSOR>\#[^\n]*)
+  | (?P<COMMENT>(?P<COMMENT_TEXT>//[^\n]*)\n?)
+  | (?P<NUMBER>[0-9][0-9.]*)
+  | (?P<IDENTIFIER>[A-Za-z_]\w*)
+  | (?P<STRING>"(?P<STRING_BODY>[^"\\]*(?:\\.[^"\\]*)*)(?:"|\\)?)
+  | (?P<OPERATOR>[-+*/%=<>!&|^~])
+  | (?P<DELIMITER>[(){}\[\]])
+  | (?P<SEPARATOR>[;,])
+  )
+''', re.VERBOSE | re.DOTALL)
+WHITESPACE_RE = re.compile(r'\s*')
+
+# The same pattern over bytes, for memory-mapped files. Only ASCII bytes are
+# classified (``\s`` and ``\w`` are ASCII-only here); anything else goes to
+# the character scanner after decoding.
+BYTES_TOKEN_RE = re.compile(TOKEN_RE.pattern.encode('ascii'), re.VERBOSE | re.DOTALL)
+BYTES_WHITESPACE_RE = re.compile(rb'[ \t\n\r\f\v]*')
+NON_ASCII_RE = re.compile(rb'[\x80-\xff]')
+BYTES_KEYWORDS = frozenset(keyword.encode('ascii') for keyword in KEYWORDS)
+# What str.strip() removes from ASCII text
+ASCII_SPACE = b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+
+
 class CLexer:
-    def __init__(self, text):
+    def __init__(self, text, engine='char', symbols=None, recover=False):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown lexer engine '{engine}', expected one of {ENGINES}")
+        if engine == 'numpy':
+            import numpy_lexer  # optional dependency, fail early without NumPy
+        self.engine = engine
+        # Identifier and keyword values are the table's shared strings
+        self.symbols = symbols if symbols is not None else SymbolTable()
         self.text = text
         self.pos = 0
         self.current_char = self.text[0] if text else None
@@ -7,9 +61,45 @@ class CLexer:
         self.column = 1
         self.start_line = 1
         self.start_column = 1
+        self.checkpoint_offsets = []
+        self.checkpoint_lines = []
+        self.checkpoint_indices = []
+        # Shifts relex() has not applied yet: checkpoints from the first
+        # index on are behind by the (offset, line, token index) deltas, and
+        # so are the lines of tokens from the first index on.
+        self._checkpoint_shift = [0, 0, 0, 0]
+        self._line_shift = [0, 0]
+        self.damaged_lines = None
+        self.line_index = None
+        # With recover=True invalid characters become ERROR tokens and are
+        # reported here, in check_syntax() format, instead of raising.
+        self.recover = recover
+        self.diagnostics = []
 
     def error(self):
-        raise Exception(f'Invalid character at line {self.line}, column {self.column}')
+        if not self.recover:
+            raise Exception(f'Invalid character at line {self.line}, column {self.column}')
+        
+        # The whole run of characters no token can start with becomes one
+        # ERROR token; lexing resumes at the next plausible token start.
+        self.mark_token_start()
+        result = ''
+        while self.current_char and not self._starts_token(self.current_char):
+            result += self.current_char
+            self.advance()
+        self._report(result, self.start_line, self.start_column)
+        return self.create_token('ERROR', result)
+
+    def _starts_token(self, char):
+        return (char.isspace() or char.isdigit() or char.isalpha() or
+                char in '_#"' or char in '+-*/%=<>!&|^~(){}[];,')
+
+    def _report(self, value, line, column):
+        self.diagnostics.append({
+            'line': line,
+            'message': f'Invalid character {value!r}',
+            'column': column
+        })
 
     def advance(self):
         if self.current_char == '\n':
@@ -32,8 +122,12 @@ class CLexer:
         }
 
     def skip_whitespace(self):
+        # Stops after a newline so that tokenize() sees every line start.
         while self.current_char and self.current_char.isspace():
+            newline = self.current_char == '\n'
             self.advance()
+            if newline:
+                break
 
     def skip_comment(self):
         
@@ -80,14 +174,8 @@ class CLexer:
             result += self.current_char
             self.advance()
 
-        keywords = {
-            'int', 'char', 'float', 'double', 'void',
-            'if', 'else', 'while', 'for', 'return',
-            'break', 'continue', 'struct', 'typedef'
-        }
-
-        token_type = 'KEYWORD' if result in keywords else 'IDENTIFIER'
-        return self.create_token(token_type, result)
+        token_type = 'KEYWORD' if result in KEYWORDS else 'IDENTIFIER'
+        return self.create_token(token_type, self.symbols.canonical(result))
 
     def get_string(self):
         self.mark_token_start()
@@ -106,58 +194,533 @@ class CLexer:
         return self.create_token('STRING', result)
 
     def tokenize(self):
-        tokens = []
+        if self.engine == 'regex':
+            return self._tokenize_regex()
+        if self.engine == 'numpy':
+            import numpy_lexer
+            return numpy_lexer.tokenize(self)
         
-        while self.pos < len(self.text):
-            if self.current_char.isspace():
-                self.skip_whitespace()
-                continue
-                
-            if self.current_char == '#':
-                tokens.append(self.get_preprocessor())
-                continue
-                
-            if self.current_char == '/' and self.pos + 1 < len(self.text):
-                if self.text[self.pos + 1] == '/':
-                    tokens.append(self.skip_comment())
-                    continue
-                    
-            if self.current_char.isdigit():
-                tokens.append(self.get_number())
-                continue
-                
-            if self.current_char.isalpha() or self.current_char == '_':
-                tokens.append(self.get_identifier())
-                continue
-                
-            if self.current_char == '"':
-                tokens.append(self.get_string())
-                continue
-                
+        tokens = []
+        self.diagnostics = []
+        self.checkpoint_offsets = []
+        self.checkpoint_lines = []
+        self.checkpoint_indices = []
+        self._checkpoint_shift = [0, 0, 0, 0]
+        self._line_shift = [0, 0]
+        self._scan(tokens, self.checkpoint_offsets, self.checkpoint_lines, self.checkpoint_indices)
+        return tokens
+
+    def relex(self, tokens, offset, deleted_length, inserted_text):
+        """Re-lexes only the part of ``tokens`` damaged by an edit.
+
+        ``tokens`` must be the list returned by this lexer's tokenize() (or a
+        previous relex()) and is updated in place. Lexing resumes from the
+        nearest line-start checkpoint before ``offset`` and stops as soon as it
+        reaches a checkpoint of the old stream behind the edit; everything after
+        that point is reused. Returns ``(first, old_stop, new_stop)``: the old
+        ``tokens[first:old_stop]`` were replaced by ``tokens[first:new_stop]``.
+        In recovery mode ``diagnostics`` is updated to match.
+
+        The ``line`` of the reused tokens after the edit is only updated by
+        settle(), so that an edit costs time in proportion to the damaged
+        region rather than to the document; call it before reading them.
+        """
+        old_text = self.text
+        old_diagnostics = self.diagnostics
+
+        delta = len(inserted_text) - deleted_length
+        line_delta = inserted_text.count('\n') - old_text.count('\n', offset, offset + deleted_length)
+        edit_end = offset + len(inserted_text)
+
+        count = len(self.checkpoint_offsets)
+        k = max(self._find_checkpoint(offset, bisect_right) - 1, 0)
+        if count:
+            start_pos, start_line, first = self._checkpoint(k)
+        else:
+            start_pos, start_line, first = 0, 1, 0
+
+        def converge(pos):
+            # Past the edit the text is unchanged, so an old checkpoint at the
+            # same (shifted) offset means the lexer is back in sync.
+            if pos < edit_end:
+                return None
+            j = self._find_checkpoint(pos - delta, bisect_left, k)
+            if j < count and self._checkpoint(j)[0] == pos - delta:
+                return j
+            return None
+
+        self.text = old_text[:offset] + inserted_text + old_text[offset + deleted_length:]
+        self._seek(start_pos, start_line)
+        new_tokens, offsets, lines, indices = [], [], [], []
+        self.diagnostics = [d for d in old_diagnostics if d['line'] < start_line]
+        try:
+            j = self._scan(new_tokens, offsets, lines, indices, converge)
+        except Exception:
+            self.text = old_text
+            self.diagnostics = old_diagnostics
+            raise
+
+        if j is None:
+            j = count
+            old_stop = len(tokens)
+            self.damaged_lines = (start_line, None)
+        else:
+            _, old_line, old_stop = self._checkpoint(j)
+            self.damaged_lines = (start_line, old_line + line_delta)
+            for diagnostic in old_diagnostics:
+                if diagnostic['line'] >= old_line:
+                    diagnostic['line'] += line_delta
+                    self.diagnostics.append(diagnostic)
+
+        if self.line_index is not None:
+            self.line_index.apply_edit(offset, deleted_length, inserted_text)
+
+        # Only the pending shifts are moved to the replaced range, which
+        # costs as much as the distance from the previous edit; the shift of
+        # this edit is then added to them.
+        self._move_checkpoint_shift(min(max(self._checkpoint_shift[0], k), j))
+        self._move_line_shift(tokens, min(max(self._line_shift[0], first), old_stop))
+        tokens[first:old_stop] = new_tokens
+        new_stop = first + len(new_tokens)
+        self.checkpoint_offsets[k:j] = offsets
+        self.checkpoint_lines[k:j] = lines
+        self.checkpoint_indices[k:j] = [i + first for i in indices]
+        shift = self._checkpoint_shift
+        shift[:] = [k + len(offsets), shift[1] + delta, shift[2] + line_delta,
+                    shift[3] + new_stop - old_stop]
+        self._line_shift = [new_stop, self._line_shift[1] + line_delta]
+        return first, old_stop, new_stop
+
+    def settle(self, tokens):
+        """Applies the line shifts relex() left pending to ``tokens``."""
+        self._move_line_shift(tokens, len(tokens))
+        self._line_shift = [len(tokens), 0]
+
+    def _checkpoint(self, j):
+        # (offset, line, token index) of checkpoint j
+        boundary, offset_delta, line_delta, index_delta = self._checkpoint_shift
+        if j < boundary:
+            return self.checkpoint_offsets[j], self.checkpoint_lines[j], self.checkpoint_indices[j]
+        return (self.checkpoint_offsets[j] + offset_delta, self.checkpoint_lines[j] + line_delta,
+                self.checkpoint_indices[j] + index_delta)
+
+    def _find_checkpoint(self, offset, bisect, lo=0):
+        # ``bisect`` of ``offset`` over the checkpoint offsets, searching the
+        # shifted ones with the offset shifted back
+        offsets = self.checkpoint_offsets
+        boundary, offset_delta = self._checkpoint_shift[:2]
+        index = bisect(offsets, offset, lo, max(boundary, lo))
+        if index < boundary:
+            return index
+        return bisect(offsets, offset - offset_delta, max(boundary, lo))
+
+    def _move_checkpoint_shift(self, boundary):
+        shift = self._checkpoint_shift
+        old_boundary, offset_delta, line_delta, index_delta = shift
+        if boundary < old_boundary:
+            start, stop = boundary, old_boundary
+            offset_delta, line_delta, index_delta = -offset_delta, -line_delta, -index_delta
+        else:
+            start, stop = old_boundary, boundary
+        if offset_delta or line_delta or index_delta:
+            offsets, lines, indices = self.checkpoint_offsets, self.checkpoint_lines, self.checkpoint_indices
+            for i in range(start, stop):
+                offsets[i] += offset_delta
+                lines[i] += line_delta
+                indices[i] += index_delta
+        shift[0] = boundary
+
+    def _move_line_shift(self, tokens, boundary):
+        old_boundary, line_delta = self._line_shift
+        if line_delta:
+            if boundary < old_boundary:
+                for i in range(boundary, old_boundary):
+                    tokens[i]['line'] -= line_delta
+            else:
+                for i in range(old_boundary, boundary):
+                    tokens[i]['line'] += line_delta
+        self._line_shift[0] = boundary
+
+    def _seek(self, pos, line, column=1):
+        self.pos = pos
+        self.line = line
+        self.column = column
+        self.current_char = self.text[pos] if pos < len(self.text) else None
+
+    def _scan(self, tokens, offsets, lines, indices, converge=None):
+        # Every line start reached between two tokens is a checkpoint: the
+        # lexer carries no state across it besides the position itself.
+        text_length = len(self.text)
+        while self.pos < text_length:
+            if self.column == 1:
+                if converge is not None:
+                    resume = converge(self.pos)
+                    if resume is not None:
+                        return resume
+                offsets.append(self.pos)
+                lines.append(self.line)
+                indices.append(len(tokens))
+
+            token = self._lex_token()
+            if token is not None:
+                tokens.append(token)
+        return None
+
+    def _lex_token(self):
+        if self.current_char.isspace():
+            self.skip_whitespace()
+            return None
             
-            self.mark_token_start()
-            if self.current_char in '+-*/%=<>!&|^~':
-                tokens.append(self.create_token('OPERATOR', self.current_char))
-                self.advance()
-                continue
-                
+        if self.current_char == '#':
+            return self.get_preprocessor()
             
-            if self.current_char in '(){}[]':
-                tokens.append(self.create_token('DELIMITER', self.current_char))
-                self.advance()
-                continue
+        if self.current_char == '/' and self.pos + 1 < len(self.text):
+            if self.text[self.pos + 1] == '/':
+                return self.skip_comment()
                 
+        if self.current_char.isdigit():
+            return self.get_number()
             
-            if self.current_char in ';,':
-                tokens.append(self.create_token('SEPARATOR', self.current_char))
-                self.advance()
-                continue
-                
-            if self.current_char == '<' or self.current_char == '>':
-                tokens.append(self.create_token('OPERATOR', self.current_char))
-                self.advance()
-                continue
-                
-            self.error()
+        if self.current_char.isalpha() or self.current_char == '_':
+            return self.get_identifier()
+            
+        if self.current_char == '"':
+            return self.get_string()
+            
+        
+        self.mark_token_start()
+        if self.current_char in '+-*/%=<>!&|^~':
+            token = self.create_token('OPERATOR', self.current_char)
+            self.advance()
+            return token
+            
+        
+        if self.current_char in '(){}[]':
+            token = self.create_token('DELIMITER', self.current_char)
+            self.advance()
+            return token
             
+        
+        if self.current_char in ';,':
+            token = self.create_token('SEPARATOR', self.current_char)
+            self.advance()
+            return token
+            
+        return self.error()
+
+    def _tokenize_regex(self):
+        text = self.text
+        self.line_index = LineIndex(text)
+        line_starts = self.line_index.starts
+        line_count = len(line_starts)
+        
+        tokens = []
+        append = tokens.append
+        self.diagnostics = []
+        line = 1
+        for kind, value, start, end in self._match_tokens(text, self.pos):
+            # Token starts only move forward, so the line pointer does too.
+            while line < line_count and line_starts[line] <= start:
+                line += 1
+            column = start - line_starts[line - 1] + 1
+            if kind == 'ERROR':
+                self._report(value, line, column)
+            append({
+                'type': kind,
+                'value': value,
+                'line': line,
+                'column': column
+            })
+        
+        self._seek(len(text), line_count, len(text) - line_starts[-1] + 1)
         return tokens
+
+    def tokenize_stream(self) -> TokenStream:
+        """Tokenizes into a compact TokenStream instead of a list of dicts."""
+        if self.engine == 'numpy':
+            import numpy_lexer
+            return numpy_lexer.tokenize_stream(self)
+        return self._tokenize_stream_regex()
+
+    def _tokenize_stream_regex(self):
+        text = self.text
+        self.line_index = LineIndex(text)
+        line_starts = self.line_index.starts
+        line_count = len(line_starts)
+        
+        stream = TokenStream(text, self.symbols)
+        append = stream.append
+        symbol_ids = self.symbols.ids
+        self.diagnostics = []
+        line = 1
+        for kind, value, start, end in self._match_tokens(text, self.pos):
+            while line < line_count and line_starts[line] <= start:
+                line += 1
+            column = start - line_starts[line - 1] + 1
+            if kind == 'ERROR':
+                self._report(value, line, column)
+            # Every value is a contiguous slice of the token, strings
+            # starting one character in, after the opening quote.
+            value_start = start + 1 if kind == 'STRING' else start
+            append(TYPE_CODES[kind], value_start, value_start + len(value), line, column,
+                   symbol_ids[value] if kind in SYMBOL_TYPES else NO_SYMBOL)
+        
+        self._seek(len(text), line_count, len(text) - line_starts[-1] + 1)
+        return stream
+
+    def _match_tokens(self, text, pos, final=True, origin=(1, 1)):
+        """Yields (type, value, start, end) for every token from ``pos`` on.
+
+        With ``final=False`` the text is treated as a prefix of a longer input:
+        matching stops before a token that touches the end of ``text``, since
+        more input could still extend it. ``origin`` is the (line, column) of
+        ``text[0]``, used for error messages.
+        """
+        text_length = len(text)
+        canonical = self.symbols.canonical
+        while pos < text_length:
+            for m in iter(TOKEN_RE.scanner(text, pos).match, None):
+                kind = m.lastgroup
+                start, end = m.span(kind)
+                if end >= text_length and not final:
+                    return
+                if kind == 'IDENTIFIER':
+                    value = canonical(m.group(kind))
+                    if value in KEYWORDS:
+                        kind = 'KEYWORD'
+                elif kind == 'STRING':
+                    value = m.group('STRING_BODY')
+                elif kind == 'COMMENT':
+                    value = m.group('COMMENT_TEXT')
+                elif kind == 'PREPROCESSOR':
+                    value = m.group(kind).strip()
+                elif kind == 'NUMBER' and end < text_length and text[end] > '\x7f':
+                    # Non-ASCII digits may continue a number; leave it to the scanner.
+                    pos = start
+                    break
+                else:
+                    value = m.group(kind)
+                yield kind, value, start, end
+                pos = end
+            else:
+                pos = WHITESPACE_RE.match(text, pos).end()
+                if pos >= text_length:
+                    return
+            
+            kind, value, end = self._scan_one(text, pos, origin)
+            if end >= text_length and not final:
+                return
+            if kind is not None:
+                yield kind, value, pos, end
+            pos = end
+
+    def _scan_one(self, text, pos, origin):
+        # Character scanner fallback for a single token (non-ASCII input or
+        # an invalid character). The real line and column are only worked
+        # out when the character turns out to be invalid; in recovery mode
+        # the caller reports the ERROR token instead.
+        scanner = CLexer(text, symbols=self.symbols, recover=self.recover)
+        scanner._seek(pos, 1)
+        try:
+            token = scanner._lex_token()
+        except Exception:
+            line, column = origin
+            newline = text.rfind('\n', 0, pos)
+            if newline == -1:
+                column += pos
+            else:
+                line += text.count('\n', 0, pos)
+                column = pos - newline
+            scanner._seek(pos, line, column)
+            scanner.error()
+        if token is None:
+            return None, None, scanner.pos
+        return token['type'], token['value'], scanner.pos
+
+    @classmethod
+    def iter_tokens(cls, fileobj, chunk_size=1 << 16):
+        """Lazily yields the tokens of a file object, reading it in chunks.
+
+        Produces the same tokens as ``CLexer(fileobj.read()).tokenize()``, but
+        only keeps the current chunk and the unfinished token at its end in
+        memory. Binary file objects are decoded as UTF-8.
+        """
+        lexer = cls('', engine='regex')
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        buffer = ''
+        line = 1
+        line_start = 0  # buffer offset of the current line, negative if it began in an earlier chunk
+        read_size = chunk_size
+        eof = False
+        while not eof:
+            chunk = fileobj.read(read_size)
+            eof = not chunk
+            if isinstance(chunk, bytes):
+                chunk = decoder.decode(chunk, final=eof)
+            buffer += chunk
+            
+            pos = 0
+            origin = (line, 1 - line_start)
+            for kind, value, start, end in lexer._match_tokens(buffer, 0, final=eof, origin=origin):
+                newlines = buffer.count('\n', pos, start)
+                if newlines:
+                    line += newlines
+                    line_start = buffer.rfind('\n', pos, start) + 1
+                yield {
+                    'type': kind,
+                    'value': value,
+                    'line': line,
+                    'column': start - line_start + 1
+                }
+                newlines = buffer.count('\n', start, end)
+                if newlines:
+                    line += newlines
+                    line_start = buffer.rfind('\n', start, end) + 1
+                pos = end
+            
+            # Whitespace is never part of a token, so it is dropped rather
+            # than kept for the next chunk.
+            skipped = WHITESPACE_RE.match(buffer, pos).end()
+            newlines = buffer.count('\n', pos, skipped)
+            if newlines:
+                line += newlines
+                line_start = buffer.rfind('\n', pos, skipped) + 1
+            pos = skipped
+            
+            # A single token longer than the buffer (e.g. a huge comment) must
+            # not be rescanned once per chunk, so grow the reads until it fits.
+            read_size = chunk_size if pos else read_size * 2
+            line_start -= pos
+            buffer = buffer[pos:]
+
+
+    @classmethod
+    def tokenize_file(cls, path) -> TokenStream:
+        """Tokenizes a file through a read-only memory map.
+
+        The returned TokenStream keeps the map as its source: token offsets
+        are byte offsets into it and values are decoded (UTF-8) only when
+        asked for, so the file is never copied into a str. Columns still
+        count characters, as in tokenize(). Close the stream to release the
+        map.
+        """
+        with open(path, 'rb') as file:
+            try:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty files cannot be mapped
+                buffer = b''
+        lexer = cls('', engine='regex')
+        stream = TokenStream(buffer, lexer.symbols)
+        intern = lexer.symbols.intern
+        
+        size = len(buffer)
+        ascii_only = NON_ASCII_RE.search(buffer) is None
+        match = BYTES_TOKEN_RE.match
+        line, line_start, line_ascii = 1, 0, ascii_only
+        next_newline = buffer.find(b'\n')
+        pos = 0
+        try:
+            while pos < size:
+                m = match(buffer, pos)
+                if m is None:
+                    pos = BYTES_WHITESPACE_RE.match(buffer, pos).end()
+                    if pos >= size:
+                        break
+                    kind = None
+                    start = pos
+                else:
+                    kind = m.lastgroup
+                    start, end = m.span(kind)
+                
+                while next_newline != -1 and next_newline < start:
+                    line += 1
+                    line_start = next_newline + 1
+                    next_newline = buffer.find(b'\n', line_start)
+                    if not ascii_only:
+                        line_end = next_newline if next_newline != -1 else size
+                        line_ascii = NON_ASCII_RE.search(buffer, line_start, line_end) is None
+                if line_ascii:
+                    column = start - line_start + 1
+                else:
+                    column = len(buffer[line_start:start].decode('utf-8', 'surrogateescape')) + 1
+                
+                if kind in ('IDENTIFIER', 'NUMBER') and end < size and buffer[end] > 0x7f:
+                    kind = None  # may continue with non-ASCII characters
+                
+                if kind is None:
+                    kind, value_start, value_end, end = lexer._scan_bytes(
+                        buffer, start, next_newline if next_newline != -1 else size, (line, column))
+                    if kind is None:
+                        pos = end
+                        continue
+                elif kind == 'STRING':
+                    value_start, value_end = m.span('STRING_BODY')
+                elif kind == 'COMMENT':
+                    value_start, value_end = m.span('COMMENT_TEXT')
+                elif kind == 'PREPROCESSOR':
+                    value_start = start
+                    if line_ascii:
+                        value_end = start + len(buffer[start:end].rstrip(ASCII_SPACE))
+                    else:
+                        value = buffer[start:end].decode('utf-8', 'surrogateescape').strip()
+                        value_end = start + len(value.encode('utf-8', 'surrogateescape'))
+                else:
+                    value_start, value_end = start, end
+                    if kind == 'IDENTIFIER' and buffer[start:end] in BYTES_KEYWORDS:
+                        kind = 'KEYWORD'
+                
+                symbol = NO_SYMBOL
+                if kind in SYMBOL_TYPES:
+                    symbol = intern(buffer[value_start:value_end].decode('utf-8', 'surrogateescape'))
+                stream.append(TYPE_CODES[kind], value_start, value_end, line, column, symbol)
+                pos = end
+        except Exception:
+            stream.close()
+            raise
+        return stream
+
+    def _scan_bytes(self, buffer, pos, line_end, origin):
+        # Decodes the rest of the line (in growing windows) and lets the
+        # character scanner take one token; a non-ASCII or otherwise unusual
+        # token never spans lines.
+        size = 256
+        while True:
+            window_end = min(line_end, pos + size)
+            while window_end < line_end and 0x80 <= buffer[window_end] < 0xc0:
+                window_end -= 1  # do not split a UTF-8 sequence
+            window = buffer[pos:window_end].decode('utf-8', 'surrogateescape')
+            kind, value, end = self._scan_one(window, 0, origin)
+            if end < len(window) or window_end == line_end:
+                break
+            size *= 2
+        end = pos + len(window[:end].encode('utf-8', 'surrogateescape'))
+        if kind is None:
+            return None, None, None, end
+        value_start = pos + 1 if kind == 'STRING' else pos
+        return kind, value_start, value_start + len(value.encode('utf-8', 'surrogateescape')), end
+
+
+def find_edit(old_text: str, new_text: str) -> Tuple[int, int, str]:
+    """Returns the edit ``(offset, deleted_length, inserted_text)`` turning
+    old_text into new_text, found by trimming their common prefix and suffix."""
+    limit = min(len(old_text), len(new_text))
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old_text.startswith(new_text[lo:mid], lo):
+            lo = mid
+        else:
+            hi = mid - 1
+    prefix = lo
+
+    old_end, new_end = len(old_text), len(new_text)
+    lo, hi = 0, limit - prefix
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old_text.endswith(new_text[new_end - mid:new_end - lo], 0, old_end - lo):
+            lo = mid
+        else:
+            hi = mid - 1
+    suffix = lo
+
+    return prefix, old_end - suffix - prefix, new_text[prefix:new_end - suffix]
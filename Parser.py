@@ -1,5 +1,49 @@
-from typing import List, Dict, Any
+import multiprocessing
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable
 from Lexer import CLexer
+from syntaxtree import AstArena, NodeView
+
+# Every parsing loop consumes at least one token per iteration (or exits), so
+# a parse takes at most about one loop step per token. The budget is a
+# safeguard against a loop that stops making progress, not a size limit.
+STEPS_PER_TOKEN = 4
+# The grammar never looks further than two tokens past the current one.
+LOOKAHEAD = 3
+# parse_parallel() parses sequentially below this many tokens; worker
+# processes take tens of milliseconds to start and the slices have to be
+# pickled to them.
+PARALLEL_THRESHOLD = 200000
+# Slices per worker, so that a slow one does not hold up the others, and the
+# smallest slice worth sending to a worker.
+SLICES_PER_WORKER = 4
+MIN_SLICE = 2000
+# Keywords that can start a top-level declaration
+TYPE_KEYWORDS = ("int", "void", "double", "float")
+
+# C binary operators: precedence (higher binds tighter) and whether they
+# group right to left.
+BINARY_OPERATORS = {
+    '=': (1, True), '+=': (1, True), '-=': (1, True), '*=': (1, True), '/=': (1, True),
+    '%=': (1, True), '&=': (1, True), '|=': (1, True), '^=': (1, True), '<<=': (1, True),
+    '>>=': (1, True),
+    '||': (2, False), '&&': (3, False), '|': (4, False), '^': (5, False), '&': (6, False),
+    '==': (7, False), '!=': (7, False),
+    '<': (8, False), '>': (8, False), '<=': (8, False), '>=': (8, False),
+    '<<': (9, False), '>>': (9, False),
+    '+': (10, False), '-': (10, False),
+    '*': (11, False), '/': (11, False), '%': (11, False)
+}
+PREFIX_OPERATORS = frozenset({'+', '-', '!', '~', '*', '&', '++', '--'})
+POSTFIX_OPERATORS = frozenset({'++', '--'})
+# The lexer returns every operator character as its own token; these are
+# the spellings adjacent ones combine into.
+COMPOUND_OPERATORS = frozenset(op for op in list(BINARY_OPERATORS) + list(PREFIX_OPERATORS) if len(op) > 1)
+OPERAND_NODES = {'IDENTIFIER': 'identifier', 'NUMBER': 'number', 'STRING': 'string_literal'}
 
 class SyntaxError(Exception):
     def __init__(self, message, line, column, token_value=None):
@@ -7,23 +51,138 @@ class SyntaxError(Exception):
         self.line = line
         self.column = column
         self.token_value = token_value
+        self.index = None  # token position, set when the parser recovers from it
         super().__init__(f"Syntax Error at line {line}, column {column}: {message}" + 
                         (f" near '{token_value}'" if token_value else ""))
 
+    def __reduce__(self):
+        # Errors come back from parse_parallel()'s worker processes pickled.
+        return (SyntaxError, (self.message, self.line, self.column, self.token_value), self.__dict__)
+
+class CancellationToken:
+    """Asks a running parse to stop, either through cancel() (e.g. from
+    another thread) or once ``timeout`` seconds have passed."""
+
+    def __init__(self, timeout: float = None):
+        self.deadline = time.perf_counter() + timeout if timeout is not None else None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def expired(self) -> bool:
+        if not self.cancelled and self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.cancelled = True
+        return self.cancelled
+
+class TokenLookahead:
+    """Bounded window over an iterator of tokens.
+
+    Holds the tokens from the parser's position up to LOOKAHEAD - 1 tokens
+    past it; tokens behind the position are dropped, so the parser can read
+    tokens as CLexer produces them without the whole list ever existing.
+    """
+
+    def __init__(self, tokens: Iterable[Dict[str, Any]]):
+        self.iterator = iter(tokens)
+        self.buffer = deque()
+        self.offset = 0  # position of buffer[0]
+        self.pulled = 0  # tokens taken from the iterator so far
+        self.last = None  # the last of them
+
+    def _pull(self):
+        token = next(self.iterator, None)
+        if token is not None:
+            self.pulled += 1
+            self.last = token
+        return token
+
+    def get(self, position: int, k: int = 0):
+        """Token ``k`` places past ``position``, or None past the end.
+        ``position`` must never move backwards."""
+        buffer = self.buffer
+        while self.offset < position:
+            if buffer:
+                buffer.popleft()
+            elif self._pull() is None:
+                return None
+            self.offset += 1
+        while len(buffer) <= k:
+            token = self._pull()
+            if token is None:
+                return None
+            buffer.append(token)
+        return buffer[k]
+
+
 class Parser:
-    def __init__(self, tokens: List[Dict[str, Any]]):
-        self.tokens = tokens
+    def __init__(self, tokens: Iterable[Dict[str, Any]], steps_per_token: int = STEPS_PER_TOKEN,
+                 cancel_token: CancellationToken = None):
+        # A token list (or TokenStream) is indexed directly; any other
+        # iterable, such as CLexer.iter_tokens(), is read through a
+        # TokenLookahead and cannot be reparsed.
+        if hasattr(tokens, '__getitem__'):
+            self.tokens, self.stream = tokens, None
+        else:
+            self.tokens, self.stream = None, TokenLookahead(tokens)
         self.current = 0
         self.tree_items = []
         self.errors = []    
-        self.max_iterations = 10000  
-        self.iteration_count = 0
+        self.steps_per_token = steps_per_token
+        self.max_steps = steps_per_token * self.token_count() + 16
+        self.steps = 0
+        # Checked at statement boundaries; once it expires parse() unwinds
+        # and returns what it has parsed so far with truncated set.
+        self.cancel_token = cancel_token
+        self.truncated = False
+        # Nodes are built into an arena; parse() returns a NodeView of the
+        # program node.
+        self.arena = AstArena()
+        self.root = None
+        # State kept by parse() for reparse(): the program node, the list of
+        # function_declaration nodes and the token span of each of them.
+        # tree is None when the last parse failed or was truncated.
+        self.tree = None
+        self.parsed_nodes = 0
+        self.top_start = 0
+        self.preprocessor_node = None
+        self.declarations_node = None
+        self.function_items = []
+        self.function_starts = []
+        self.function_ends = []
 
-    def check_iteration_limit(self):
-        
-        self.iteration_count += 1
-        if self.iteration_count > self.max_iterations:
-            raise Exception("Maximum parser iterations exceeded - possible infinite loop")
+    @classmethod
+    def from_file(cls, fileobj, **kwargs) -> 'Parser':
+        """Parser fed straight from CLexer.iter_tokens(fileobj), so that
+        neither the source nor its token list is held in memory whole."""
+        return cls(CLexer.iter_tokens(fileobj), **kwargs)
+
+    def token_count(self) -> int:
+        """Number of tokens, or of those read so far from an iterator."""
+        return len(self.tokens) if self.stream is None else self.stream.pulled
+
+    def lookahead(self, k: int = 0) -> Dict:
+        """Token ``k`` (< LOOKAHEAD) places past the current one, or None."""
+        if self.stream is not None:
+            return self.stream.get(self.current, k)
+        index = self.current + k
+        if index < len(self.tokens):
+            return self.tokens[index]
+        return None
+
+    def should_stop(self) -> bool:
+        if self.cancel_token is not None and self.cancel_token.expired():
+            self.truncated = True
+        return self.truncated
+
+    def check_budget(self):
+        # Called once per iteration of every parsing loop.
+        self.steps += 1
+        if self.steps > self.max_steps:
+            # An iterator's length is only known as far as it has been read.
+            self.max_steps = self.steps_per_token * self.token_count() + 16
+        if self.steps > self.max_steps:
+            raise Exception("Parser step budget exceeded - parser stopped making progress")
 
     def add_error(self, message: str, line: int, column: int, token_value: str = None):
         
@@ -33,29 +192,37 @@ class Parser:
 
     def peek(self) -> Dict:
         
-        self.check_iteration_limit()
+        if self.stream is not None:
+            return self.stream.get(self.current)
         if self.current < len(self.tokens):
             return self.tokens[self.current]
         return None
 
     def peek_next(self) -> Dict:
         
-        self.check_iteration_limit()
+        if self.stream is not None:
+            return self.stream.get(self.current, 1)
         if self.current + 1 < len(self.tokens):
             return self.tokens[self.current + 1]
         return None
 
     def consume(self, expected_type: str = None) -> Dict:
         
-        self.check_iteration_limit()
-        
-        if self.current >= len(self.tokens):
-            last_token = self.tokens[-1] if self.tokens else {'line': 1, 'column': 1}
+        if self.stream is not None:
+            current_token = self.stream.get(self.current)
+        elif self.current < len(self.tokens):
+            current_token = self.tokens[self.current]
+        else:
+            current_token = None
+        if current_token is None:
+            if self.stream is not None:
+                last_token = self.stream.last or {'line': 1, 'column': 1}
+            else:
+                last_token = self.tokens[-1] if self.tokens else {'line': 1, 'column': 1}
             raise SyntaxError("Unexpected end of file", 
                             last_token.get('line', 1), 
                             last_token.get('column', 1))
         
-        current_token = self.tokens[self.current]
         if expected_type and current_token.get('type') != expected_type:
             raise SyntaxError(
                 f"Expected {expected_type}, found {current_token.get('type')}", 
@@ -67,6 +234,42 @@ class Parser:
         self.current += 1
         return current_token
 
+    def recover(self, error: SyntaxError, top_level: bool = False):
+        """Panic-mode recovery: records ``error`` and skips tokens up to
+        and including the next ';', or up to the next '}', which is left for
+        the enclosing block. A block opened on the way (e.g. the body of an
+        if whose ')' is missing) is skipped whole and ends the skip, so its
+        '}' does not close the enclosing block. At top level, where no block
+        is open, '}' is skipped too and the next type keyword also ends the
+        skip."""
+        error.index = self.current
+        self.errors.append(error)
+        depth = 0
+        while True:
+            token = self.peek()
+            if token is None:
+                return
+            value = token['value']
+            if value == '{':
+                depth += 1
+            elif value == '}':
+                if depth == 0:
+                    if top_level:
+                        self.current += 1
+                    return
+                depth -= 1
+                if depth == 0:
+                    self.current += 1
+                    return
+            elif depth:
+                pass
+            elif value == ';':
+                self.current += 1
+                return
+            elif top_level and token['type'] == "KEYWORD" and value in TYPE_KEYWORDS:
+                return
+            self.current += 1
+
     def expect(self, value: str):
         
         token = self.peek()
@@ -79,76 +282,325 @@ class Parser:
             )
         self.consume()
 
-    def parse(self) -> Dict:
+    def node(self, kind: str, start: int, value=None, children=None, end: int = None) -> int:
+        """Adds a node spanning tokens ``start`` to ``end`` (default: the
+        current position) to the arena and returns its index."""
+        # Statements skipping a missing ')' or ';' can step past the end.
+        limit = self.token_count()
+        end = self.current if end is None else end
+        return self.arena.add(kind, min(start, limit), min(end, limit), value, children)
+
+    def token_node(self, kind: str, index: int, token: Dict) -> int:
+        """Adds a leaf node holding the value of ``token``, the token at
+        ``index``."""
+        return self.arena.add(kind, index, index + 1, token['value'])
+
+    def parse(self) -> NodeView:
         """Main parse method"""
+        return self._parse(self._parse_top_level)
+
+    def parse_parallel(self, workers: int = None, threshold: int = PARALLEL_THRESHOLD,
+                       executor: Executor = None) -> NodeView:
+        """parse(), with the top-level functions parsed in worker processes.
+
+        The tokens are cut at top-level function starts into slices of about
+        equal size, which ``executor`` (by default a ProcessPoolExecutor of
+        ``workers`` processes) parses independently. Below ``threshold``
+        tokens, with fewer than two workers or slices, or for a token
+        iterator, this is a plain parse(). The tree, spans and errors are
+        the same as parse() would give.
+        """
+        workers = workers or os.cpu_count() or 1
+        if (self.stream is not None or len(self.tokens) < max(threshold, 1) or
+                (workers < 2 and executor is None)):
+            return self.parse()
+        return self._parse(lambda items, starts, ends:
+                           self._parse_slices(items, starts, ends, workers, executor))
+
+    def _parse(self, parse_functions) -> NodeView:
         try:
-            self.iteration_count = 0  # Reset iteration counter
+            self.steps = 0
+            self.truncated = False
+            self.tree = None
+            self.arena = AstArena()
             
             # Ana program node'unu oluştur
-            program_node = {
-                'type': 'program',
-                'children': []
-            }
+            self.root = self.node('program', 0, children=[])
             
             # Preprocessor bölümü
             preprocessor_items = []
             while self.peek() and self.peek()['type'] == "PREPROCESSOR":
-                self.check_iteration_limit()
+                self.check_budget()
+                if self.should_stop():
+                    break
                 directive = self.parse_preprocessor()
-                if directive:
+                if directive is not None:
                     preprocessor_items.append(directive)
             
+            self.preprocessor_node = None
             if preprocessor_items:
-                program_node['children'].append({
-                    'type': 'preprocessor',
-                    'children': preprocessor_items
-                })
+                self.preprocessor_node = self.node('preprocessor', 0, children=preprocessor_items)
             
             
-            function_items = []
-            while self.peek() is not None:
-                self.check_iteration_limit()
-                
-                if (self.peek()['type'] == "KEYWORD" and 
-                    self.peek()['value'] in ["int", "void", "double", "float"] and
-                    self.peek_next() and 
-                    self.peek_next()['type'] == "IDENTIFIER"):
-                    
-                    
-                    if (self.current + 2 < len(self.tokens) and 
-                        self.tokens[self.current + 2]['value'] == '('):
-                        func_decl = self.parse_function_declaration()
-                        if func_decl:
-                            function_items.append(func_decl)
-                    else:
-                        
-                        self.current += 1
-                else:
-                    self.current += 1
-            
-            if function_items:
-                program_node['children'].append({
-                    'type': 'function_declarations',
-                    'children': function_items
-                })
+            self.declarations_node = None
+            self.top_start = self.current
+            self.function_items, self.function_starts, self.function_ends = [], [], []
+            parse_functions(self.function_items, self.function_starts, self.function_ends)
+            self._link_program()
             
+            program_node = self.arena.view(self.root)
+            if not self.truncated:
+                self.tree = program_node
+                self.parsed_nodes = len(self.arena)
             return program_node
             
         except Exception as e:
+            return self._parse_failed(e)
+
+    def reparse(self, first: int, old_stop: int, new_stop: int) -> NodeView:
+        """Re-parses only the top-level functions touched by an edit.
+
+        ``self.tokens`` must already be edited so that the old
+        ``tokens[first:old_stop]`` became ``tokens[first:new_stop]``, as
+        CLexer.relex() does in place. Functions ending before the edit are
+        kept; parsing resumes behind the last of them and stops as soon as it
+        reaches the start of an old function behind the edit, which is reused
+        together with all later ones. The new functions are spliced into the
+        previous program node, which is returned. Falls back to parse() when
+        there is no complete previous tree, the preprocessor part changed or
+        replaced nodes make up most of the arena.
+        """
+        if self.stream is not None:
+            raise ValueError("reparse() needs a token list, not an iterator")
+        program_node = self.tree
+        if program_node is not None and first == old_stop == new_stop:
+            # Same tokens, but an edit between them may have moved lines.
+            self.errors = [self._moved_error(e, e.index) if e.index is not None else e for e in self.errors]
+            return program_node
+        old_errors = self.errors
+        self.errors = []
+        self.steps = 0
+        self.truncated = False
+        self.max_steps = self.steps_per_token * self.token_count() + 16
+        if (program_node is None or first <= self.top_start or
+                len(self.arena) > 2 * self.parsed_nodes + 4096):
+            self.current = 0
+            return self.parse()
+
+        old_starts = self.function_starts
+        old_ends = self.function_ends
+        delta = new_stop - old_stop
+        # A function's parse may look one token past its end (e.g. for a
+        # missing '{'), so only functions ending before ``first`` are kept.
+        k = bisect_left(old_ends, first)
+
+        def converge(pos):
+            # Past the edit the tokens are unchanged, so reaching the start
+            # of an old function means the rest parses as before.
+            if pos < new_stop:
+                return None
+            j = bisect_left(old_starts, pos - delta, k)
+            if j < len(old_starts) and old_starts[j] == pos - delta:
+                return j
+            return None
+
+        self.current = resume = old_ends[k - 1] if k else self.top_start
+        self.errors = [e for e in old_errors if e.index is not None and e.index < resume]
+        new_items, starts, ends = [], [], []
+        try:
+            j = self._parse_top_level(new_items, starts, ends, converge)
+        except Exception as e:
+            return self._parse_failed(e)
+        if j is None:
+            j = len(old_starts)
+        else:
+            # Errors in the reused functions move with them. One at the very
+            # start of a function came from the parse before it.
+            for error in old_errors:
+                if error.index is not None and error.index > old_starts[j]:
+                    self.errors.append(self._moved_error(error, error.index + delta))
+
+        # Later functions keep their subtrees; their spans are relative to
+        # the function node, so moving the node moves all of them.
+        function_items = self.function_items
+        for function in function_items[j:]:
+            self.arena.shift(function, delta)
+        function_items[k:j] = new_items
+        self.function_starts = old_starts[:k] + starts + [s + delta for s in old_starts[j:]]
+        self.function_ends = old_ends[:k] + ends + [e + delta for e in old_ends[j:]]
+        self._link_program()
+        if self.truncated:
+            self.tree = None
+        return program_node
+
+    def _parse_top_level(self, function_items, starts, ends, converge=None):
+        # Parses top-level items from self.current, recording the token span
+        # of every function. Returns what ``converge`` returned when it
+        # stopped the loop, None otherwise.
+        while self.peek() is not None:
+            self.check_budget()
+            if self.should_stop():
+                break
+            if converge is not None:
+                resume = converge(self.current)
+                if resume is not None:
+                    return resume
             
-            token = self.peek() or {'line': 1, 'column': 1}
-            self.add_error(f"Unexpected parsing error: {str(e)}", 
-                         token.get('line', 1), 
-                         token.get('column', 1))
-            return {'type': 'program', 'children': []}
+            if (self.peek()['type'] == "KEYWORD" and 
+                self.peek()['value'] in TYPE_KEYWORDS and
+                self.peek_next() and 
+                self.peek_next()['type'] == "IDENTIFIER"):
+                
+                
+                if (self.lookahead(2) and 
+                    self.lookahead(2)['value'] == '('):
+                    start = self.current
+                    first_node = len(self.arena)
+                    try:
+                        func_decl = self.parse_function_declaration()
+                    except SyntaxError as e:
+                        self.recover(e, top_level=True)
+                        continue
+                    if func_decl is not None:
+                        self.arena.anchor(func_decl, first_node)
+                        function_items.append(func_decl)
+                        starts.append(start)
+                        ends.append(min(self.current, self.token_count()))
+                else:
+                    
+                    self.current += 1
+            else:
+                self.current += 1
+        return None
+
+    def _slices(self, workers: int) -> List[tuple]:
+        # Cuts the tokens from self.current at top-level function starts,
+        # found by brace depth alone, into slices of at least MIN_SLICE
+        # tokens, SLICES_PER_WORKER slices per worker where there are enough.
+        tokens = self.tokens
+        size = max(MIN_SLICE, (len(tokens) - self.current) // (workers * SLICES_PER_WORKER))
+        cuts = [self.current]
+        depth = 0
+        for index in range(self.current, len(tokens) - 2):
+            token = tokens[index]
+            value = token['value']
+            if value == '{':
+                depth += 1
+            elif value == '}':
+                depth = max(depth - 1, 0)
+            elif (depth == 0 and index - cuts[-1] >= size and token['type'] == "KEYWORD" and
+                    value in TYPE_KEYWORDS and tokens[index + 1]['type'] == "IDENTIFIER" and
+                    tokens[index + 2]['value'] == '('):
+                cuts.append(index)
+        cuts.append(len(tokens))
+        return list(zip(cuts, cuts[1:]))
+
+    def _parse_slices(self, function_items, starts, ends, workers, executor):
+        # _parse_top_level() over the slices from _slices(). A worker stops
+        # where its slice ends; if it got there at a top-level item
+        # boundary, its functions are those the sequential loop would
+        # parse. From the first slice where it did not, the loop runs here
+        # until it reaches the start of a later slice.
+        slices = self._slices(workers)
+        if len(slices) < 2:
+            return self._parse_top_level(function_items, starts, ends)
+        tokens = self.tokens
+        own_pool = executor is None
+        shared = own_pool and 'fork' in multiprocessing.get_all_start_methods()
+        if shared:
+            # Forked workers inherit the tokens instead of having them
+            # pickled, which would take a good part of a sequential parse.
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                           initializer=_share_tokens, initargs=(tokens,))
+        elif own_pool:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        futures = []
+        try:
+            # Each slice comes with the LOOKAHEAD tokens after it, which is as
+            # far as the parser looks from a position inside it.
+            if shared:
+                futures = [executor.submit(_parse_shared_slice, start, stop, self.steps_per_token)
+                           for start, stop in slices]
+            else:
+                futures = [executor.submit(_parse_slice, tokens[start:stop + LOOKAHEAD], stop - start,
+                                           self.steps_per_token)
+                           for start, stop in slices]
+            slice_at = {start: i for i, (start, _) in enumerate(slices)}
+            i = 0
+            while i < len(slices):
+                start, stop = slices[i]
+                if self.should_stop():
+                    break
+                try:
+                    result = futures[i].result()
+                except Exception:
+                    result = None
+                if result is None or result[-1] is False:
+                    first = start
+
+                    def converge(pos):
+                        return slice_at.get(pos) if pos > first else None
+
+                    self.current = start
+                    resume = self._parse_top_level(function_items, starts, ends, converge)
+                    if resume is None:
+                        break
+                    i = resume
+                    continue
+                arena, items, slice_starts, slice_ends, errors, _ = result
+                offset = self.arena.extend(arena, start)
+                function_items.extend(item + offset for item in items)
+                starts.extend(position + start for position in slice_starts)
+                ends.extend(position + start for position in slice_ends)
+                for error in errors:
+                    error.index += start
+                self.errors.extend(errors)
+                self.current = stop
+                i += 1
+        finally:
+            for future in futures:
+                future.cancel()
+            if own_pool:
+                executor.shutdown(wait=False, cancel_futures=True)
+        return None
+
+    def _moved_error(self, error, index):
+        # The error re-created for the token now at ``index``; at the end of
+        # the input it points at the last token, as consume() does.
+        if self.tokens:
+            token = self.tokens[min(index, len(self.tokens) - 1)]
+            error = SyntaxError(error.message, token['line'], token['column'], error.token_value)
+        error.index = index
+        return error
+
+    def _link_program(self):
+        # (Re)links the program node to its preprocessor and function lists.
+        arena = self.arena
+        children = [] if self.preprocessor_node is None else [self.preprocessor_node]
+        if self.function_items:
+            if self.declarations_node is None:
+                self.declarations_node = arena.add('function_declarations', 0, 0)
+            declarations = self.declarations_node
+            arena.set_children(declarations, self.function_items)
+            arena.token_starts[declarations] = self.function_starts[0]
+            arena.token_ends[declarations] = self.function_ends[-1]
+            children.append(declarations)
+        arena.set_children(self.root, children)
+        arena.token_ends[self.root] = self.token_count()
+
+    def _parse_failed(self, e):
+        self.tree = None
+        token = self.peek() or {'line': 1, 'column': 1}
+        self.add_error(f"Unexpected parsing error: {str(e)}", 
+                     token.get('line', 1), 
+                     token.get('column', 1))
+        self.arena = AstArena()
+        return self.arena.view(self.arena.add('program', 0, self.token_count(), children=[]))
 
     def parse_preprocessor(self):
        
-        token = self.consume("PREPROCESSOR")
-        return {
-            'type': 'preprocessor',
-            'value': token['value']
-        }
+        directive = self.consume("PREPROCESSOR")
+        return self.token_node('preprocessor', self.current - 1, directive)
 
     def parse_statement(self):
        
@@ -161,7 +613,7 @@ class Parser:
             next_token = self.peek_next()
             if next_token and next_token['type'] == "IDENTIFIER":
               
-                if self.current + 2 < len(self.tokens) and self.tokens[self.current + 2]['value'] == '(':
+                if self.lookahead(2) and self.lookahead(2)['value'] == '(':
                     return self.parse_function_declaration()
                 else:
                     return self.parse_variable_declaration()
@@ -188,6 +640,7 @@ class Parser:
 
     def parse_function_declaration(self):
         
+        start = self.current
         return_type = self.consume("KEYWORD")
         if not return_type:
             return None
@@ -202,18 +655,18 @@ class Parser:
         self.consume()
 
         
+        parameters_start = self.current
         parameters = []
         while self.peek() and self.peek()['value'] != ')':
+            self.check_budget()
+            param_start = self.current
             param_type = self.consume("KEYWORD")
             param_name = self.consume("IDENTIFIER")
             if param_type and param_name:
-                parameters.append({
-                    'type': 'parameter',
-                    'children': [
-                        {'type': 'type', 'value': param_type['value']},
-                        {'type': 'identifier', 'value': param_name['value']}
-                    ]
-                })
+                parameters.append(self.node('parameter', param_start, children=[
+                    self.token_node('type', param_start, param_type),
+                    self.token_node('identifier', param_start + 1, param_name)
+                ]))
             
             
             if self.peek() and self.peek()['value'] == ',':
@@ -222,33 +675,50 @@ class Parser:
 
         if not self.peek() or self.peek()['value'] != ')':
             return None
+        parameters_node = self.node('parameters', parameters_start, children=parameters)
         self.consume()  
 
         
+        block_start = self.current
         body_statements = []
         if self.peek() and self.peek()['value'] == '{':
             self.consume()  
-            
-            while self.peek() and self.peek()['value'] != '}':
-                stmt = self.parse_statement()
-                if stmt:
-                    body_statements.append(stmt)
+            body_statements = self.parse_block_statements()
             
             if self.peek():
                 self.consume()  
 
-        return {
-            'type': 'function_declaration',
-            'children': [
-                {'type': 'return_type', 'value': return_type['value']},
-                {'type': 'function_name', 'value': function_name['value']},
-                {'type': 'parameters', 'children': parameters},
-                {'type': 'block', 'children': body_statements}
-            ]
-        }
+        return self.node('function_declaration', start, children=[
+            self.token_node('return_type', start, return_type),
+            self.token_node('function_name', start + 1, function_name),
+            parameters_node,
+            self.node('block', block_start, children=body_statements)
+        ])
+
+    def parse_block_statements(self):
+        """Parses statements up to the closing '}', which is left unconsumed."""
+        statements = []
+        while self.peek() and self.peek()['value'] != '}':
+            self.check_budget()
+            if self.should_stop():
+                break
+            start = self.current
+            try:
+                stmt = self.parse_statement()
+            except SyntaxError as e:
+                self.recover(e)
+                continue
+            if stmt is not None:
+                statements.append(stmt)
+            if self.current == start:
+                # Nothing could be parsed here; skip the token so the loop
+                # always moves forward.
+                self.current += 1
+        return statements
 
     def parse_variable_declaration(self):
         
+        start = self.current
         type_token = self.consume("KEYWORD")
         if not type_token:
             return None
@@ -257,121 +727,204 @@ class Parser:
         if not id_token:
             return None
 
-        node = {
-            'type': 'variable_declaration',
-            'children': [
-                {'type': 'type', 'value': type_token['value']},
-                {'type': 'identifier', 'value': id_token['value']}
-            ]
-        }
+        children = [
+            self.token_node('type', start, type_token),
+            self.token_node('identifier', start + 1, id_token)
+        ]
 
         
         if self.peek() and self.peek()['value'] == '=':
+            initialization_start = self.current
             self.consume()  
             expression = self.parse_expression()
-            if expression:
-                node['children'].append({
-                    'type': 'initialization',
-                    'children': [expression]
-                })
+            if expression is None:
+                self.syntax_error("Expected expression")
+            children.append(self.node('initialization', initialization_start, children=[expression]))
 
         
         if self.peek() and self.peek()['value'] == ';':
             self.consume()
 
-        return node
+        return self.node('variable_declaration', start, children=children)
 
     def parse_expression(self):
-        
-        token = self.peek()
-        if not token:
-            return None
+        """Parses an expression with C operator precedence and associativity.
 
-        
-        left = self.parse_term()
-        if not left:
-            return None
+        Precedence climbing over explicit operand and operator stacks, so
+        neither long expressions nor deep parentheses recurse. Returns None,
+        having consumed nothing, if no expression starts at the current token.
+        """
+        operands = []  # (node, first token)
+        frames = []    # pending operators and open brackets, innermost last
+        expect_operand = True
+        while True:
+            self.check_budget()
+            token = self.peek()
+            operator, count = self.peek_operator()
+            if expect_operand:
+                if operator in PREFIX_OPERATORS:
+                    frames.append(('prefix', operator, self.current))
+                    self.current += count
+                elif token is not None and token['value'] == '(' and token['type'] == 'DELIMITER':
+                    frames.append(('group', self.current))
+                    self.current += 1
+                elif token is not None and token['type'] in OPERAND_NODES:
+                    start = self.current
+                    self.current += 1
+                    following = self.peek()
+                    if token['type'] == 'IDENTIFIER' and following and following['value'] == '(':
+                        self.current += 1
+                        frames.append(('call', token['value'], start, []))
+                        following = self.peek()
+                        if not following or following['value'] != ')':
+                            continue
+                        self.current += 1
+                        frames.pop()
+                        node = self.node('function_call', start, value=token['value'], children=[])
+                    else:
+                        node = self.token_node(OPERAND_NODES[token['type']], start, token)
+                    operands.append((node, start))
+                    expect_operand = False
+                elif not operands and not frames:
+                    return None
+                else:
+                    self.syntax_error("Expected expression")
+                continue
 
-        
-        while self.peek() and self.peek()['type'] == 'OPERATOR':
-            operator = self.consume()
-            right = self.parse_term()
-            if not right:
+            if operator in POSTFIX_OPERATORS:
+                node, start = operands.pop()
+                self.current += count
+                operands.append((self.node('postfix_operation', start, value=operator, children=[node]), start))
+                continue
+            if operator in BINARY_OPERATORS:
+                precedence, right_to_left = BINARY_OPERATORS[operator]
+                self._reduce(operands, frames, precedence, right_to_left)
+                frames.append(('binary', operator, precedence))
+                self.current += count
+                expect_operand = True
+                continue
+            value = token['value'] if token is not None and token['type'] in ('DELIMITER', 'SEPARATOR') else None
+            if value == '[':
+                frames.append(('subscript',))
+                self.current += 1
+                expect_operand = True
+                continue
+            if value not in (')', ']', ','):
+                break
+            self._reduce(operands, frames)
+            if not frames:
+                break  # the caller's bracket, e.g. the ')' of an if condition
+            frame = frames[-1]
+            if frame[0] == 'group' and value == ')':
+                frames.pop()
+                self.current += 1
+                node, _ = operands.pop()
+                operands.append((node, frame[1]))
+            elif frame[0] == 'call' and value != ']':
+                frame[3].append(operands.pop()[0])
+                self.current += 1
+                if value == ',':
+                    expect_operand = True
+                else:
+                    frames.pop()
+                    operands.append((self.node('function_call', frame[2], value=frame[1], children=frame[3]),
+                                     frame[2]))
+            elif frame[0] == 'subscript' and value == ']':
+                frames.pop()
+                self.current += 1
+                index, _ = operands.pop()
+                array, start = operands.pop()
+                operands.append((self.node('subscript', start, children=[array, index]), start))
+            else:
                 break
 
-            
-            left = {
-                'type': 'arithmetic_operation',
-                'operator': operator['value'],
-                'children': [left, right]
-            }
-
-        return left
+        self._reduce(operands, frames)
+        if frames:
+            self.syntax_error("Expected ']'" if frames[-1][0] == 'subscript' else "Expected ')'")
+        return operands[0][0]
 
-    def parse_term(self):
+    def _reduce(self, operands, frames, precedence=0, right_to_left=False):
+        # Folds the pending operators that bind tighter than an operator of
+        # ``precedence`` into nodes, stopping at the innermost open bracket.
+        while frames:
+            frame = frames[-1]
+            if frame[0] == 'prefix':
+                operand, _ = operands.pop()
+                node = self.node('unary_operation', frame[2], value=frame[1], children=[operand])
+                operands.append((node, frame[2]))
+            elif frame[0] == 'binary':
+                if frame[2] < precedence or (frame[2] == precedence and right_to_left):
+                    return
+                right, _ = operands.pop()
+                left, start = operands.pop()
+                node = self.node('arithmetic_operation', start, value=frame[1], children=[left, right])
+                operands.append((node, start))
+            else:
+                return
+            frames.pop()
 
+    def peek_operator(self):
+        """The operator at the current token and the number of tokens it
+        spans: adjacent operator characters combine ('<', '<', '=' is '<<=').
+        Returns (None, 0) if the current token is not an operator."""
         token = self.peek()
-        if not token:
-            return None
+        if token is None or token['type'] != 'OPERATOR':
+            return None, 0
+        operator, count = token['value'], 1
+        while count < LOOKAHEAD:
+            following = self.lookahead(count)
+            if (following is None or following['type'] != 'OPERATOR' or
+                    following['line'] != token['line'] or following['column'] != token['column'] + 1 or
+                    operator + following['value'] not in COMPOUND_OPERATORS):
+                break
+            operator += following['value']
+            count += 1
+            token = following
+        return operator, count
 
-        if token['type'] == 'IDENTIFIER':
-            self.consume()
-            return {
-                'type': 'identifier',
-                'value': token['value']
-            }
-        elif token['type'] == 'NUMBER':
+    def syntax_error(self, message: str):
+        """Raises ``message`` at the current token (or end of file)."""
+        token = self.peek()
+        if token is None:
             self.consume()
-            return {
-                'type': 'number',
-                'value': token['value']
-            }
-        elif token['value'] == '(':
-            self.consume()  
-            expr = self.parse_expression()
-            if self.peek() and self.peek()['value'] == ')':
-                self.consume()  
-                return expr
-        return None
+        raise SyntaxError(message, token.get('line', 1), token.get('column', 1), token.get('value'))
 
     def parse_if_statement(self):
 
-        if not self.consume("KEYWORD") or self.peek()['value'] != '(':
-            return None
+        start = self.current
+        self.consume("KEYWORD")
+        if not self.peek() or self.peek()['value'] != '(':
+            self.syntax_error("Expected '('")
 
+        condition_start = self.current
         self.consume()  
         condition = self.parse_expression()
-        
-        if not condition or not self.peek() or self.peek()['value'] != ')':
-            return None
+        if condition is None:
+            self.syntax_error("Expected expression")
+        if not self.peek() or self.peek()['value'] != ')':
+            self.syntax_error("Expected ')'")
 
         self.consume()  
 
-        node = {
-            'type': 'if_statement',
-            'children': [
-                {'type': 'condition', 'children': [condition]}
-            ]
-        }
+        children = [self.node('condition', condition_start, children=[condition])]
 
        
         if self.peek() and self.peek()['value'] == '{':
+            body_start = self.current
             self.consume()  
-            body = []
-            while self.peek() and self.peek()['value'] != '}':
-                stmt = self.parse_statement()
-                if stmt:
-                    body.append(stmt)
-            self.consume()  
+            body = self.parse_block_statements()
+            if self.peek():
+                self.consume()  
             
-            node['children'].append({'type': 'body', 'children': body})
+            children.append(self.node('body', body_start, children=body))
 
-        return node
+        return self.node('if_statement', start, children=children)
 
     def parse_expression_statement(self):
         
+        start = self.current
         expr = self.parse_expression()
-        if not expr:
+        if expr is None:
             return None
 
         
@@ -379,130 +932,94 @@ class Parser:
             self.consume()
 
         
-        if isinstance(expr, dict) and expr['type'] == 'function_call' and expr.get('function_name') == 'printf':
-            return {
-                'type': 'expression_statement',
-                'children': [expr]
-            }
+        if self.arena.type(expr) == 'function_call' and self.arena.values[expr] == 'printf':
+            return self.node('expression_statement', start, children=[expr])
 
-        return {
-            'type': 'expression_statement',
-            'children': [expr]
-        }
+        return self.node('expression_statement', start, children=[expr])
 
     def parse_while_statement(self):
         
-        statement = {
-            'type': 'while_statement',
-            'children': []
-        }
+        start = self.current
+        children = []
         
         self.current += 1  
         
         
-        if self.current < len(self.tokens) and self.tokens[self.current]['value'] == "(":
+        if self.peek() and self.peek()['value'] == "(":
             self.current += 1
+            condition_start = self.current
             condition = []
-            while self.current < len(self.tokens) and self.tokens[self.current]['value'] != ")":
-                condition.append(self.tokens[self.current]['value'])
+            while self.peek() and self.peek()['value'] != ")":
+                condition.append(self.peek()['value'])
                 self.current += 1
             
-            statement['children'].append({
-                'type': 'condition',
-                'value': ' '.join(condition)
-            })
+            children.append(self.node('condition', condition_start, value=' '.join(condition)))
             
             self.current += 1  
 
-        self.tree_items.append(statement)
+        self.tree_items.append(self.node('while_statement', start, children=children))
 
     def parse_for_statement(self):
 
-        statement = {
-            'type': 'for_statement',
-            'children': []
-        }
+        start = self.current
+        children = []
         
         self.current += 1  
         
         
-        if self.current < len(self.tokens) and self.tokens[self.current]['value'] == "(":
+        if self.peek() and self.peek()['value'] == "(":
             self.current += 1
             
             
+            init_start = self.current
             init = []
-            while self.current < len(self.tokens) and self.tokens[self.current]['value'] != ";":
-                init.append(self.tokens[self.current]['value'])
+            while self.peek() and self.peek()['value'] != ";":
+                init.append(self.peek()['value'])
                 self.current += 1
-            statement['children'].append({
-                'type': 'initialization',
-                'value': ' '.join(init)
-            })
+            children.append(self.node('initialization', init_start, value=' '.join(init)))
             self.current += 1  
             
             
+            condition_start = self.current
             condition = []
-            while self.current < len(self.tokens) and self.tokens[self.current]['value'] != ";":
-                condition.append(self.tokens[self.current]['value'])
+            while self.peek() and self.peek()['value'] != ";":
+                condition.append(self.peek()['value'])
                 self.current += 1
-            statement['children'].append({
-                'type': 'condition',
-                'value': ' '.join(condition)
-            })
+            children.append(self.node('condition', condition_start, value=' '.join(condition)))
             self.current += 1  
             
             
+            increment_start = self.current
             increment = []
-            while self.current < len(self.tokens) and self.tokens[self.current]['value'] != ")":
-                increment.append(self.tokens[self.current]['value'])
+            while self.peek() and self.peek()['value'] != ")":
+                increment.append(self.peek()['value'])
                 self.current += 1
-            statement['children'].append({
-                'type': 'increment',
-                'value': ' '.join(increment)
-            })
+            children.append(self.node('increment', increment_start, value=' '.join(increment)))
             
             self.current += 1  
 
-        self.tree_items.append(statement)
+        self.tree_items.append(self.node('for_statement', start, children=children))
 
-    def parse_function_call(self):
-        
-        function_name = self.consume('IDENTIFIER')
-        if not function_name:
-            return None
 
-        
-        if not self.peek() or self.peek()['value'] != '(':
-            return None
-        self.consume()  
+_shared_tokens = None  # the tokens, in the workers of parse_parallel()'s own pool
 
-        
-        parameters = []
-        while self.peek() and self.peek()['value'] != ')':
-            
-            if self.peek()['type'] == 'STRING':
-                param = self.consume()
-                parameters.append({
-                    'type': 'string_literal',
-                    'value': param['value']
-                })
-            
-            else:
-                expr = self.parse_expression()
-                if expr:
-                    parameters.append(expr)
 
-          
-            if self.peek() and self.peek()['value'] == ',':
-                self.consume()
+def _share_tokens(tokens):
+    global _shared_tokens
+    _shared_tokens = tokens
+
+
+def _parse_shared_slice(start, stop, steps_per_token):
+    return _parse_slice(_shared_tokens[start:stop + LOOKAHEAD], stop - start, steps_per_token)
 
- 
-        if not self.peek() or self.peek()['value'] != ')':
-            return None
-        self.consume() 
 
-        return {
-            'type': 'function_call',
-            'function_name': function_name['value'],
-            'children': parameters
-        } 
\ No newline at end of file
+def _parse_slice(tokens, stop, steps_per_token):
+    # Runs in a parse_parallel() worker: the top-level loop over one slice,
+    # up to the first item boundary at or past ``stop``. The last element
+    # tells whether that boundary is ``stop`` itself.
+    parser = Parser(tokens, steps_per_token)
+    items, starts, ends = [], [], []
+    resume = parser._parse_top_level(items, starts, ends,
+                                     lambda pos: pos if pos >= stop else None)
+    clean = resume == stop or (resume is None and stop == len(tokens))
+    return parser.arena, items, starts, ends, parser.errors, clean
@@ -0,0 +1,403 @@
+"""Headless benchmark suite for CLexer, Parser and CSyntaxChecker.
+
+    python benchmark.py --size 2000000 --repeat 3 [--stream]
+    python benchmark.py --shape all --size 200000 --json results.json
+    python benchmark.py --shape all --size 200000 --compare results.json
+    python benchmark.py --scaling --size 1000000
+
+Sources come from a deterministic generator with several shapes (see
+SHAPES). For every shape the lexer engines are timed, then the stages an
+analysis in the GUI runs: lexing, parsing and the line checker. Peak memory
+is measured in a separate, untimed run under tracemalloc.
+
+Every available engine is checked against the char engine's output before
+it is timed. The numpy engine is skipped when NumPy is not installed.
+Results can be saved as JSON and compared against a saved run; a stage that
+got slower than ``--threshold`` is reported as a regression and makes the
+script exit with status 1.
+
+``--scaling`` instead parses sources of ``size``, 2 * ``size`` and 4 * ``size``
+characters (about 1M tokens for the largest at the default size) and fails
+unless the parse time per token stays flat.
+"""
+import argparse
+import gc
+import io
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from Lexer import CLexer, ENGINES
+from cache import AnalysisCache, analyze
+from Parser import Parser
+from error import CSyntaxChecker
+from lineindex import LineIndex
+from ll1 import LL1Parser, load_table
+
+FUNCTION_TEMPLATE = """int {name}(int a, int b) {{
+    int total = a * {n} + b;
+    // accumulate {name}
+    if (total > {n}) {{
+        total = total - b;
+    }}
+    printf("{name}: %d\\n", total);
+    return total;
+}}
+
+"""
+
+NESTED_DEPTH = 24
+STRING_LENGTH = (200, 2000)
+# Largest allowed growth of the parse time per token across --scaling sizes
+SCALING_TOLERANCE = 1.5
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'value', 'total', 'index', 'count', 'buffer', 'result')
+
+
+def _function(rng, index):
+    return FUNCTION_TEMPLATE.format(name=f'f{index}', n=rng.randint(0, 10000))
+
+
+def _nested(rng, index):
+    expression = 'a'
+    for _ in range(NESTED_DEPTH):
+        operand = rng.choice(('a', 'b', str(rng.randint(0, 999))))
+        expression = f'({expression} {rng.choice("+-*/")} {operand})'
+    return (f'int n{index}(int a, int b) {{\n'
+            f'    int total = {expression};\n'
+            f'    return total;\n'
+            f'}}\n\n')
+
+
+def _strings(rng, index):
+    length = rng.randint(*STRING_LENGTH)
+    words = []
+    while length > 0:
+        word = rng.choice(WORDS)
+        if rng.random() < 0.05:
+            word = '\\"' + word + '\\"'
+        words.append(word)
+        length -= len(word) + 1
+    return (f'void s{index}(int a) {{\n'
+            f'    printf("{" ".join(words)}\\n", a);\n'
+            f'}}\n\n')
+
+
+def _comments(rng, index):
+    lines = [f'// {" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))}\n'
+             for _ in range(rng.randint(3, 8))]
+    return ''.join(lines) + (f'int c{index}(int a) {{\n'
+                             f'    // {rng.choice(WORDS)}\n'
+                             f'    return a + {rng.randint(0, 99)};\n'
+                             f'}}\n\n')
+
+
+def _preprocessor(rng, index):
+    lines = []
+    for i in range(rng.randint(4, 10)):
+        if rng.random() < 0.5:
+            lines.append(f'#define {rng.choice(WORDS).upper()}_{index}_{i} {rng.randint(0, 9999)}\n')
+        else:
+            lines.append(f'#include <{rng.choice(WORDS)}{index % 97}.h>\n')
+    return ''.join(lines) + f'int p{index} = {rng.randint(0, 99)};\n\n'
+
+
+# Shape name -> function producing the index-th chunk of a source
+SHAPES = {
+    'functions': _function,
+    'nested': _nested,
+    'strings': _strings,
+    'comments': _comments,
+    'preprocessor': _preprocessor
+}
+
+
+def generate_source(size: int, seed: int = 0, shape: str = 'functions') -> str:
+    """Deterministic C-like source of roughly ``size`` characters."""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown shape '{shape}', expected one of {tuple(SHAPES)}")
+    chunk = SHAPES[shape]
+    rng = random.Random(seed)
+    parts = ['#include <stdio.h>\n\n']
+    length = len(parts[0])
+    index = 0
+    while length < size:
+        part = chunk(rng, index)
+        parts.append(part)
+        length += len(part)
+        index += 1
+    return ''.join(parts)
+
+
+def available_engines():
+    engines = []
+    for engine in ENGINES:
+        try:
+            CLexer('', engine=engine)
+        except ImportError:
+            continue
+        engines.append(engine)
+    return engines
+
+
+def peak_memory(function, *args):
+    """Peak bytes allocated by Python while running ``function(*args)``."""
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_lexer(text: str, engine: str, repeat: int = 3, stream: bool = False):
+    """Best-of-``repeat`` timing of one engine over ``text``.
+
+    With ``stream`` the engine fills a TokenStream instead of token dicts.
+    """
+    def run():
+        lexer = CLexer(text, engine=engine)
+        return lexer.tokenize_stream() if stream else lexer.tokenize()
+
+    best, tokens = _best_time(run, repeat)
+    return {
+        'engine': engine,
+        'seconds': best,
+        'tokens': len(tokens),
+        'tokens_per_second': len(tokens) / best,
+        'mb_per_second': len(text) / best / 1e6,
+        'peak_bytes': peak_memory(run)
+    }
+
+
+def bench_stages(text: str, repeat: int = 3):
+    """Best-of-``repeat`` timings of the lex, parse and check stages.
+
+    Each stage is timed on its own; parse runs over the char engine's tokens
+    and lex+parse streams CLexer.iter_tokens() straight into the parser.
+    parse[ll1] runs the table-driven parser of the documented grammar, which
+    reports errors for C the grammar leaves out (e.g. '<'), and parse[pool]
+    parses functions in one worker process per core, pool start included.
+    check[tokens] runs the checker over parse's tokens instead of the text,
+    and check[edit] is check_lines() after a one-character edit.
+    analyze runs all three into an Analysis, which analyze[disk] reads back
+    from an AnalysisCache directory and analyze[memory] finds in memory.
+    Parse and check results also carry the number of errors they reported.
+    """
+    tokens = CLexer(text).tokenize()
+    checker = CSyntaxChecker()
+    table = load_table()
+
+    def parse(source=tokens, parser_class=Parser, **kwargs):
+        parser = parser_class(source, **kwargs)
+        try:
+            parser.parse()
+        except Exception as e:  # e.g. the iteration limit, raised from parse()'s own handler
+            parser.errors.append(e)
+        return parser
+
+    def parse_pool():
+        parser = Parser(tokens)
+        parser.parse_parallel(threshold=0)
+        return parser
+
+    store = tempfile.mkdtemp(prefix='analysis-cache-')
+    memory_cache = AnalysisCache()
+    memory_cache.get(text)
+    AnalysisCache(directory=store).get(text)
+
+    incremental = CSyntaxChecker()
+    line_index = LineIndex(text)
+    incremental.check_lines(text, line_index)
+    middle = text.rfind('\n', 0, len(text) // 2) + 1
+    typed = []
+
+    def check_edit():
+        # Types a space at the start of a line in the middle, or takes it out again
+        edit = line_index.apply_edit(middle, len(typed), ' ' * (1 - len(typed)))
+        typed[:] = [] if typed else [' ']
+        return incremental.check_lines(text[:middle] + ''.join(typed) + text[middle:], line_index, [edit])
+
+    stages = {
+        'lex': lambda: CLexer(text, recover=True).tokenize(),  # as CCodeText lexes
+        'parse': parse,
+        'lex+parse': lambda: parse(CLexer.iter_tokens(io.StringIO(text))),
+        'parse[ll1]': lambda: parse(parser_class=LL1Parser, table=table),
+        'parse[pool]': parse_pool,
+        'check': lambda: checker.check_syntax(text),
+        'check[tokens]': lambda: checker.check_tokens(tokens),
+        'check[edit]': check_edit,
+        'analyze': lambda: analyze(text),
+        'analyze[disk]': lambda: AnalysisCache(directory=store).get(text),
+        'analyze[memory]': lambda: memory_cache.get(text)
+    }
+    results = []
+    for stage, function in stages.items():
+        best, result = _best_time(function, repeat)
+        entry = {
+            'stage': stage,
+            'seconds': best,
+            'tokens_per_second': len(tokens) / best,
+            'mb_per_second': len(text) / best / 1e6,
+            'peak_bytes': peak_memory(function)
+        }
+        if stage in ('parse', 'lex+parse', 'parse[pool]'):
+            # A parse that gives up early looks fast; report how far it got.
+            entry['errors'] = len(result.errors)
+            entry['tokens_parsed'] = result.current
+        elif stage == 'parse[ll1]':
+            entry['errors'] = len(result.errors)
+        elif stage in ('check', 'check[tokens]', 'check[edit]'):
+            entry['errors'] = len(result)
+        results.append(entry)
+    shutil.rmtree(store, ignore_errors=True)
+    return results
+
+
+def run_suite(shapes, size, seed=0, repeat=3, stream=False, stages=True):
+    """Runs the benchmarks for every shape and returns JSON-ready results."""
+    results = []
+    for shape in shapes:
+        text = generate_source(size, seed, shape)
+        reference = CLexer(text).tokenize()
+        for engine in available_engines():
+            if CLexer(text, engine=engine).tokenize() != reference:
+                raise SystemExit(f'engine {engine!r} does not match the char engine on {shape!r}')
+            result = bench_lexer(text, engine, repeat, stream)
+            result.update(shape=shape, chars=len(text), name=f'lex[{engine}]')
+            results.append(result)
+        if stages:
+            for result in bench_stages(text, repeat):
+                result.update(shape=shape, chars=len(text), tokens=len(reference), name=result['stage'])
+                results.append(result)
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'size': size,
+        'seed': seed,
+        'repeat': repeat,
+        'stream': stream,
+        'results': results
+    }
+
+
+def check_parse_scaling(size, seed=0, shape='functions', repeat=3, factors=(1, 2, 4)):
+    """Parses sources of ``size * factor`` characters and returns
+    ``(linear, rows)``, where each row is ``(tokens, seconds, us_per_token)``.
+
+    The parse must consume every token without errors. The collector is
+    paused while timing, since its passes over the growing heap of token
+    dicts would otherwise hide the parser's own behaviour.
+    """
+    rows = []
+    for factor in factors:
+        tokens = CLexer(generate_source(size * factor, seed, shape), engine='regex').tokenize()
+        best = float('inf')
+        for _ in range(repeat):
+            parser = Parser(tokens)
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                parser.parse()
+                best = min(best, time.perf_counter() - start)
+            finally:
+                gc.enable()
+            if parser.errors or parser.current != len(tokens):
+                raise SystemExit(f'parse of {len(tokens)} tokens stopped at token {parser.current}: '
+                                 f'{parser.errors[:1]}')
+        rows.append((len(tokens), best, best / len(tokens) * 1e6))
+    per_token = [row[2] for row in rows]
+    return max(per_token) <= min(per_token) * SCALING_TOLERANCE, rows
+
+
+def compare(baseline, current, threshold=0.1):
+    """Matches results by (shape, name) and returns the regressions.
+
+    A regression is a benchmark whose time grew by more than ``threshold``
+    (a fraction) over the baseline.
+    """
+    old = {(r['shape'], r['name']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        before = old.get((result['shape'], result['name']))
+        if before is None:
+            continue
+        ratio = result['seconds'] / before['seconds']
+        result['baseline_seconds'] = before['seconds']
+        result['ratio'] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(result)
+    return regressions
+
+
+def print_results(suite):
+    print(f"{'shape':<13} {'benchmark':<15} {'seconds':>9} {'MB/s':>8} {'tokens/s':>12} {'peak MB':>8} {'vs base':>8}")
+    for result in suite['results']:
+        ratio = f"{result['ratio']:.2f}x" if 'ratio' in result else ''
+        print(f"{result['shape']:<13} {result['name']:<15} {result['seconds']:>9.3f} "
+              f"{result['mb_per_second']:>8.2f} {result['tokens_per_second']:>12.0f} "
+              f"{result['peak_bytes'] / 1e6:>8.1f} {ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=1000000, help='source size in characters')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--shape', choices=tuple(SHAPES) + ('all',), default='functions')
+    parser.add_argument('--stream', action='store_true', help='time tokenize_stream() instead of tokenize()')
+    parser.add_argument('--no-stages', action='store_true', help='only time the lexer engines')
+    parser.add_argument('--json', metavar='PATH', help='save the results as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='compare against results saved with --json')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown (fraction) reported as a regression, default 0.1')
+    parser.add_argument('--scaling', action='store_true', help='check that parsing time grows linearly')
+    args = parser.parse_args()
+
+    if args.scaling:
+        linear, rows = check_parse_scaling(args.size, args.seed, args.shape if args.shape != 'all' else 'functions',
+                                           args.repeat)
+        print(f"{'tokens':>10} {'seconds':>9} {'us/token':>9}")
+        for tokens, seconds, us_per_token in rows:
+            print(f'{tokens:>10} {seconds:>9.3f} {us_per_token:>9.2f}')
+        if not linear:
+            print(f'parse time per token grew more than {SCALING_TOLERANCE}x')
+            sys.exit(1)
+        return
+
+    shapes = tuple(SHAPES) if args.shape == 'all' else (args.shape,)
+    suite = run_suite(shapes, args.size, args.seed, args.repeat, args.stream, not args.no_stages)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(json.load(file), suite, args.threshold)
+    print_results(suite)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(suite, file, indent=2)
+    if regressions:
+        print(f'{len(regressions)} regression(s) over {args.threshold:.0%}:')
+        for result in regressions:
+            print(f"  {result['shape']} {result['name']}: {result['baseline_seconds']:.3f}s -> "
+                  f"{result['seconds']:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
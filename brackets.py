@@ -0,0 +1,296 @@
+import random
+from typing import Dict, List, Optional
+
+# Kind (the opening bracket) of every bracket
+BRACKET_KINDS = {'(': '(', ')': '(', '[': '[', ']': '[', '{': '{', '}': '{'}
+OPENING = frozenset('([{')
+
+
+class _Node:
+    """Treap node for one bracket.
+
+    ``gap`` is the distance in tokens from the previous bracket of the tree
+    (from token 0 for the first one), so positions are never stored and
+    shifting everything after an edit only changes one gap. ``step`` is +1
+    for an opening bracket and -1 for a closing one. The subtree sums of
+    gaps and steps are ``span`` and ``depth``; ``low`` and ``low_before``
+    are the smallest depth within the subtree after and before a bracket.
+    """
+
+    __slots__ = ('gap', 'step', 'priority', 'left', 'right', 'span', 'depth', 'low', 'low_before')
+
+    def __init__(self, gap: int, step: int):
+        self.gap = gap
+        self.step = step
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.span = gap
+        self.depth = step
+        self.low = step
+        self.low_before = 0
+
+
+def _update(node: _Node):
+    left, right = node.left, node.right
+    span, depth = node.gap, node.step
+    if left is None:
+        low, low_before = node.step, 0
+    else:
+        low = min(left.low, left.depth + node.step)
+        low_before = min(left.low_before, left.depth)
+        span += left.span
+        depth += left.depth
+    if right is not None:
+        low = min(low, depth + right.low)
+        low_before = min(low_before, depth + right.low_before)
+        span += right.span
+        depth += right.depth
+    node.span, node.depth, node.low, node.low_before = span, depth, low, low_before
+
+
+def _add_to_first_gap(node: _Node, amount: int):
+    # Moves every bracket of the tree by ``amount`` tokens.
+    while node is not None:
+        node.span += amount
+        if node.left is None:
+            node.gap += amount
+            return
+        node = node.left
+
+
+def _split(node: _Node, position: int, offset: int = 0):
+    # (brackets before ``position``, the others); ``offset`` is the
+    # position of the bracket before the subtree. The first gap of the
+    # second tree is still relative to the last bracket of the first.
+    if node is None:
+        return None, None
+    here = offset + (node.left.span if node.left is not None else 0) + node.gap
+    if here < position:
+        left, right = _split(node.right, position, here)
+        node.right = left
+        _update(node)
+        return node, right
+    left, right = _split(node.left, position, offset)
+    node.left = right
+    _update(node)
+    return left, node
+
+
+def _merge(left: _Node, right: _Node) -> _Node:
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def split(root: _Node, position: int):
+    """Splits a tree into the brackets before ``position`` and the others,
+    both with their positions unchanged."""
+    left, right = _split(root, position)
+    if left is not None and right is not None:
+        _add_to_first_gap(right, left.span)
+    return left, right
+
+
+def join(left: _Node, right: _Node) -> _Node:
+    """Joins two trees, all of whose brackets in ``left`` come first."""
+    if left is not None and right is not None:
+        _add_to_first_gap(right, -left.span)
+    return _merge(left, right)
+
+
+def build(brackets) -> _Node:
+    """Tree of ``(position, step)`` pairs sorted by position, built in
+    linear time as the Cartesian tree of the random priorities."""
+    stack = []
+    previous = 0
+    for position, step in brackets:
+        node = _Node(position - previous, step)
+        previous = position
+        last = None
+        while stack and stack[-1].priority < node.priority:
+            last = stack.pop()
+            _update(last)
+        node.left = last
+        if stack:
+            stack[-1].right = node
+        stack.append(node)
+    root = stack[0] if stack else None
+    while stack:
+        _update(stack.pop())
+    return root
+
+
+def _locate(node: _Node, position: int):
+    # The node at ``position`` and the depth before it, or (None, 0)
+    offset = depth = 0
+    while node is not None:
+        left = node.left
+        here = offset + (left.span if left is not None else 0) + node.gap
+        if position < here:
+            node = left
+        elif position > here:
+            offset = here
+            depth += (left.depth if left is not None else 0) + node.step
+            node = node.right
+        else:
+            return node, depth + (left.depth if left is not None else 0)
+    return None, 0
+
+
+def _first_below(node: _Node, after: int, threshold: int, offset: int = 0, depth: int = 0):
+    # Position of the first bracket past ``after`` with a depth below
+    # ``threshold`` after it; ``offset`` and ``depth`` are those before the subtree.
+    if node is None or depth + node.low >= threshold or offset + node.span <= after:
+        return None
+    left = node.left
+    found = _first_below(left, after, threshold, offset, depth)
+    if found is not None:
+        return found
+    here = offset + (left.span if left is not None else 0) + node.gap
+    depth += (left.depth if left is not None else 0) + node.step
+    if here > after and depth < threshold:
+        return here
+    return _first_below(node.right, after, threshold, here, depth)
+
+
+def _last_below(node: _Node, before: int, threshold: int, offset: int = 0, depth: int = 0):
+    # Position of the last bracket before ``before`` with a depth below
+    # ``threshold`` before it.
+    if node is None or depth + node.low_before >= threshold:
+        return None
+    left = node.left
+    here = offset + (left.span if left is not None else 0) + node.gap
+    if here < before:
+        ahead = depth + (left.depth if left is not None else 0)
+        found = _last_below(node.right, before, threshold, here, ahead + node.step)
+        if found is not None:
+            return found
+        if ahead < threshold:
+            return here
+    return _last_below(left, before, threshold, offset, depth)
+
+
+class BracketIndex:
+    """Bracket pairs of a whole token list, kept current across edits.
+
+    Each kind of bracket has its own treap of bracket positions (token
+    indices), with the bracket depth summed over every subtree. An edit
+    (the ranges CLexer.relex() returns), finding the match of a bracket
+    and finding each unmatched bracket take O(log n) time. Brackets pair
+    up within their kind only: '( [ ) ]' counts as matched.
+    """
+
+    def __init__(self):
+        self.roots: Dict[str, _Node] = dict.fromkeys(OPENING)
+
+    @classmethod
+    def from_tokens(cls, tokens) -> 'BracketIndex':
+        index = cls()
+        index.roots = cls._build_roots(tokens, 0, len(tokens))
+        return index
+
+    @staticmethod
+    def _build_roots(tokens, start, stop):
+        brackets = {kind: [] for kind in OPENING}
+        for position in range(start, stop):
+            token = tokens[position]
+            kind = BRACKET_KINDS.get(token['value'])
+            if kind is not None and token['type'] == 'DELIMITER':
+                brackets[kind].append((position, 1 if token['value'] in OPENING else -1))
+        return {kind: build(pairs) for kind, pairs in brackets.items()}
+
+    def update(self, tokens, first: int, old_stop: int, new_stop: int):
+        """Follows CLexer.relex() replacing tokens ``first`` to ``old_stop``
+        with ``tokens[first:new_stop]``."""
+        inserted = self._build_roots(tokens, first, new_stop)
+        for kind, root in self.roots.items():
+            before, rest = split(root, first)
+            _, after = split(rest, old_stop)
+            _add_to_first_gap(after, new_stop - old_stop)
+            self.roots[kind] = join(join(before, inserted[kind]), after)
+
+    def match(self, position: int) -> Optional[int]:
+        """Position of the bracket matching the one at ``position``, or None
+        if it is unmatched or no bracket."""
+        for root in self.roots.values():
+            node, depth = _locate(root, position)
+            if node is not None:
+                if node.step > 0:
+                    return _first_below(root, position, depth + 1)
+                return _last_below(root, position, depth)
+        return None
+
+    def unmatched(self) -> List[int]:
+        """Positions of all unmatched brackets, in order."""
+        positions = []
+        for root in self.roots.values():
+            if root is None:
+                continue
+            lowest = min(root.low, 0)
+            # Closing brackets that take the depth to a new low, and the
+            # last opening bracket left at each level above the lowest
+            for level in range(-1, lowest - 1, -1):
+                positions.append(_first_below(root, -1, level + 1))
+            for level in range(root.depth - 1, lowest - 1, -1):
+                positions.append(_last_below(root, root.span + 1, level + 1))
+        positions.sort()
+        return positions
+
+    def __len__(self):
+        return sum(self._count(root) for root in self.roots.values())
+
+    @staticmethod
+    def _count(node: _Node) -> int:
+        count, stack = 0, [node]
+        while stack:
+            node = stack.pop()
+            if node is not None:
+                count += 1
+                stack.extend((node.left, node.right))
+        return count
+
+
+def unmatched_brackets(tokens) -> List[int]:
+    """BracketIndex.from_tokens(tokens).unmatched(), by one stack scan for
+    when no index is kept."""
+    stacks = {kind: [] for kind in OPENING}
+    positions = []
+    for position, token in enumerate(tokens):
+        kind = BRACKET_KINDS.get(token['value'])
+        if kind is not None and token['type'] == 'DELIMITER':
+            stack = stacks[kind]
+            if token['value'] in OPENING:
+                stack.append(position)
+            elif stack:
+                stack.pop()
+            else:
+                positions.append(position)
+    for stack in stacks.values():
+        positions.extend(stack)
+    positions.sort()
+    return positions
+
+
+def token_at(tokens, line: int, column: int) -> Optional[int]:
+    """Index of the token starting at ``line`` and ``column``, or None,
+    by binary search over the token positions."""
+    low, high = 0, len(tokens)
+    while low < high:
+        middle = (low + high) // 2
+        token = tokens[middle]
+        if (token['line'], token['column']) < (line, column):
+            low = middle + 1
+        else:
+            high = middle
+    if low < len(tokens) and tokens[low]['line'] == line and tokens[low]['column'] == column:
+        return low
+    return None
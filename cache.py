@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from Lexer import CLexer
+from Parser import Parser, SyntaxError
+from error import CSyntaxChecker
+from symbols import SymbolTable
+from syntaxtree import AstArena, NodeView
+from tokenstream import TokenStream
+
+# Part of every key: bump it whenever the lexer, parser or checker output
+# changes, so that stale entries on disk are never hit.
+CACHE_VERSION = 5
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+MAGIC = b'CAN1'
+# Columns written to disk, in file order; the element types are those of
+# TokenStream and AstArena.
+TOKEN_COLUMNS = ('kinds', 'starts', 'ends', 'lines', 'columns', 'symbols')
+NODE_COLUMNS = ('kinds', 'first_child', 'next_sibling', 'token_starts', 'token_ends')
+
+
+def source_key(text: str, engine: str = 'char') -> str:
+    """Cache key of ``text`` as lexed by ``engine``."""
+    digest = hashlib.sha256(f'{CACHE_VERSION}\n{engine}\n'.encode('utf-8'))
+    digest.update(text.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+class Analysis:
+    """Tokens, parse tree and diagnostics of one source text.
+
+    ``errors`` are the lexer's and CSyntaxChecker.check_tokens()'s
+    diagnostics; ``parse_errors`` are the parser's SyntaxErrors.
+    An Analysis from the cache is shared by every caller that gets it, so
+    it must be treated as read-only (e.g. never passed to Parser.reparse()).
+    """
+
+    __slots__ = ('key', 'tokens', 'arena', 'root', 'errors', 'parse_errors')
+
+    def __init__(self, key: str, tokens: TokenStream, arena: AstArena, root: int,
+                 errors: List[Dict[str, Any]], parse_errors: List[SyntaxError]):
+        self.key = key
+        self.tokens = tokens
+        self.arena = arena
+        self.root = root
+        self.errors = errors
+        self.parse_errors = parse_errors
+
+    @property
+    def tree(self) -> NodeView:
+        return self.arena.view(self.root)
+
+    def nbytes(self) -> int:
+        """Rough memory held by the analysis, source text included."""
+        spellings = self.tokens.symbol_table.spellings
+        return (len(self.tokens.source) + self.tokens.nbytes() + self.arena.nbytes() +
+                sum(len(spelling) + 50 for spelling in spellings) +
+                200 * (len(self.errors) + len(self.parse_errors)))
+
+    def to_bytes(self) -> bytes:
+        """The analysis without its source text, in the on-disk format:
+        MAGIC, the byte order, the length of a JSON header and the header,
+        then the raw token and node columns."""
+        tokens, arena = self.tokens, self.arena
+        header = json.dumps({
+            'key': self.key,
+            'root': self.root,
+            'tokens': len(tokens),
+            'nodes': len(arena),
+            'spellings': tokens.symbol_table.spellings,
+            'values': arena.values,
+            'anchors': sorted(arena.anchors),
+            'errors': self.errors,
+            'parse_errors': [[e.message, e.line, e.column, e.token_value, e.index]
+                             for e in self.parse_errors]
+        }, ensure_ascii=False).encode('utf-8', 'surrogatepass')  # like source_key()
+        parts = [MAGIC, sys.byteorder[0].encode('ascii'), struct.pack('<I', len(header)), header]
+        parts.extend(getattr(tokens, name).tobytes() for name in TOKEN_COLUMNS)
+        parts.extend(getattr(arena, name).tobytes() for name in NODE_COLUMNS)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, text: str) -> 'Analysis':
+        """Reads to_bytes() output back for the source ``text``. Raises
+        ValueError on data that is not in that format."""
+        if data[:4] != MAGIC or len(data) < 9:
+            raise ValueError('not an analysis cache entry')
+        swap = data[4:5].decode('ascii') != sys.byteorder[0]
+        header_length, = struct.unpack_from('<I', data, 5)
+        position = 9 + header_length
+        header = json.loads(data[9:position].decode('utf-8', 'surrogatepass'))
+
+        def read(column, count):
+            nonlocal position
+            column = array(column.typecode)
+            stop = position + count * column.itemsize
+            if stop > len(data):
+                raise ValueError('truncated analysis cache entry')
+            column.frombytes(data[position:stop])
+            if swap:
+                column.byteswap()
+            position = stop
+            return column
+
+        symbol_table = SymbolTable()
+        symbol_table.spellings = header['spellings']
+        symbol_table.ids = {spelling: symbol for symbol, spelling in enumerate(symbol_table.spellings)}
+        tokens = TokenStream(text, symbol_table)
+        for name in TOKEN_COLUMNS:
+            setattr(tokens, name, read(getattr(tokens, name), header['tokens']))
+        arena = AstArena()
+        for name in NODE_COLUMNS:
+            setattr(arena, name, read(getattr(arena, name), header['nodes']))
+        arena.values = header['values']
+        arena.anchors = set(header['anchors'])
+        parse_errors = []
+        for message, line, column, token_value, index in header['parse_errors']:
+            error = SyntaxError(message, line, column, token_value)
+            error.index = index
+            parse_errors.append(error)
+        return cls(header['key'], tokens, arena, header['root'], header['errors'], parse_errors)
+
+
+def analyze(text: str, engine: str = 'char', checker: CSyntaxChecker = None) -> Analysis:
+    """Lexes, parses and checks ``text`` without the cache."""
+    lexer = CLexer(text, engine=engine, recover=True)
+    tokens = lexer.tokenize_stream()
+    # The parser peeks at each token several times; a TokenStream would
+    # build the token's dict every time.
+    token_list = tokens[:]
+    parser = Parser(token_list)
+    tree = parser.parse()
+    checker = checker if checker is not None else CSyntaxChecker()
+    errors = lexer.diagnostics + checker.check_tokens(token_list, tree=tree)
+    return Analysis(source_key(text, engine), tokens, parser.arena, tree.node, errors, parser.errors)
+
+
+class AnalysisCache:
+    """Content-addressed cache of analyze() results.
+
+    Entries are found by source_key(), so the same text gets the same
+    analysis back however it came about (an undo, a reopened file). The
+    most recently used entries are kept in memory up to ``max_bytes``
+    (estimated by Analysis.nbytes()); with a ``directory`` every analysis
+    is also written there and read back when it is not in memory.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, directory: str = None,
+                 engine: str = 'char'):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.engine = engine
+        self.checker = CSyntaxChecker()
+        self.entries = OrderedDict()  # key -> (Analysis, nbytes), oldest first
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, text: str) -> Analysis:
+        """The analysis of ``text``, computed only when neither memory nor
+        the disk store has it."""
+        key = source_key(text, self.engine)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        analysis = self._load(key, text)
+        if analysis is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            analysis = analyze(text, self.engine, self.checker)
+            self._save(analysis)
+        self._remember(analysis)
+        return analysis
+
+    def _remember(self, analysis: Analysis):
+        nbytes = analysis.nbytes()
+        if nbytes > self.max_bytes:
+            return  # would evict everything else and still not fit
+        self.entries[analysis.key] = (analysis, nbytes)
+        self.size += nbytes
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.bin')
+
+    def _load(self, key: str, text: str):
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key), 'rb') as f:
+                analysis = Analysis.from_bytes(f.read(), text)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None  # missing, or left half-written or by another version
+        return analysis if analysis.key == key else None
+
+    def _save(self, analysis: Analysis):
+        if self.directory is None:
+            return
+        path = self.path(analysis.key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under another name first, so readers never see half a file
+            partial = f'{path}.{os.getpid()}.tmp'
+            with open(partial, 'wb') as f:
+                f.write(analysis.to_bytes())
+            os.replace(partial, path)
+        except (OSError, UnicodeError):
+            pass  # the store is best effort, like the LL(1) table cache
+
+    def clear(self):
+        """Empties the in-memory part; the disk store is left alone."""
+        self.entries.clear()
+        self.size = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, text: str) -> bool:
+        return source_key(text, self.engine) in self.entries
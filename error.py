@@ -1,6 +1,215 @@
 import re
 from typing import List, Dict, Tuple
 
+from brackets import BRACKET_KINDS, BracketIndex, unmatched_brackets
+from lineindex import LineIndex
+from rules import Rule, RuleRegistry, Source
+
+# Messages for unmatched brackets of each kind, in the order they are reported
+BRACKET_MESSAGES = (('Parantezler eşleşmiyor', '('), ('Süslü parantezler eşleşmiyor', '{'),
+                    ('Köşeli parantezler eşleşmiyor', '['))
+BRACKET_ORDER = {kind: order for order, (_, kind) in enumerate(BRACKET_MESSAGES)}
+# Runs reported by _check_invalid_operators, in the order it tries them
+INVALID_OPERATORS = ('+++', '---', '**', '===', '!==', '&&&&', '|||')
+DECLARATION_TYPES = ('int', 'char', 'float', 'double', 'void', 'long', 'short')
+# Tokens matching [a-zA-Z_][a-zA-Z0-9_]*; CLexer knows few keywords, so
+# e.g. 'long' and 'switch' are IDENTIFIERs
+WORD_TYPES = ('IDENTIFIER', 'KEYWORD')
+
+
+def _token_end(token) -> int:
+    """Column just past ``token`` on the line it starts on; string values
+    come without their quotes."""
+    value = token['value']
+    if token['type'] == 'STRING':
+        newline = value.find('\n')
+        return token['column'] + (len(value) + 2 if newline < 0 else newline + 1)
+    return token['column'] + len(value)
+
+
+class TokenLine:
+    """The tokens starting on one line, as the line rules see them: ``code``
+    leaves out comments, ``runs`` are the ``(text, column)`` runs of two or
+    more adjacent operators."""
+
+    __slots__ = ('number', 'code', 'runs', 'has_open', 'has_close', 'has_for')
+
+    def __init__(self, number, code, runs, has_open, has_close, has_for):
+        self.number = number
+        self.code = code
+        self.runs = runs
+        self.has_open = has_open
+        self.has_close = has_close
+        self.has_for = has_for
+
+
+def token_lines(tokens) -> List[TokenLine]:
+    """The lines of ``tokens`` that hold code, in one pass over them."""
+    lines = []
+    number = None
+    code = runs = None
+    has_open = has_close = has_for = False
+    run, run_column, run_end = '', 0, None
+    for token in tokens:
+        if token['line'] != number:
+            if code:
+                if len(run) > 1:
+                    runs.append((run, run_column))
+                lines.append(TokenLine(number, code, runs, has_open, has_close, has_for))
+            number = token['line']
+            code, runs = [], []
+            has_open = has_close = has_for = False
+            run, run_column, run_end = '', 0, None
+        kind = token['type']
+        if kind == 'COMMENT':
+            continue
+        code.append(token)
+        value = token['value']
+        if kind == 'DELIMITER':
+            if value == '(':
+                has_open = True
+            elif value == ')':
+                has_close = True
+        elif kind == 'OPERATOR':
+            column = token['column']
+            if column == run_end:
+                run += value
+            else:
+                if len(run) > 1:
+                    runs.append((run, run_column))
+                run, run_column = value, column
+            run_end = column + len(value)
+        elif value == 'for' and kind in WORD_TYPES:
+            has_for = True
+    if code:
+        if len(run) > 1:
+            runs.append((run, run_column))
+        lines.append(TokenLine(number, code, runs, has_open, has_close, has_for))
+    return lines
+
+
+def _is_function_header(code) -> bool:
+    # Token form of the 'type name(...) {' pattern _should_have_semicolon
+    # looks for.
+    if (len(code) < 4 or code[0]['type'] not in WORD_TYPES or code[1]['type'] not in WORD_TYPES or
+            code[2]['type'] != 'DELIMITER' or code[2]['value'] != '('):
+        return False
+    for index in range(3, len(code)):
+        token = code[index]
+        if token['type'] == 'DELIMITER' and token['value'] == ')':
+            rest = code[index + 1:]
+            return not rest or (len(rest) == 1 and rest[0]['type'] == 'DELIMITER' and
+                                rest[0]['value'] == '{')
+    return False
+
+
+def _valid_declaration(code) -> bool:
+    # Like _check_valid_declaration: before any '=' and the closing ';'s,
+    # the second whitespace-separated word must be a plain name.
+    stop = len(code)
+    while stop and code[stop - 1]['type'] == 'SEPARATOR' and code[stop - 1]['value'] == ';':
+        stop -= 1
+    for index in range(stop):
+        if code[index]['type'] == 'OPERATOR' and code[index]['value'] == '=':
+            stop = index
+            break
+    if stop < 2:
+        return False
+    name = code[1]
+    return name['type'] in WORD_TYPES and (stop == 2 or code[2]['column'] > _token_end(name))
+
+
+def _ends_statement(token) -> bool:
+    return token['type'] == 'SEPARATOR' and token['value'] == ';'
+
+
+def check_semicolon(line: TokenLine):
+    first, last = line.code[0], line.code[-1]
+    if (_ends_statement(last) or (last['type'] == 'DELIMITER' and last['value'] in ('{', '}')) or
+            first['type'] == 'PREPROCESSOR' or (line.has_for and line.has_open and line.has_close) or
+            (first['type'] in WORD_TYPES and first['value'] in ('if', 'while', 'switch')) or
+            _is_function_header(line.code)):
+        return ()
+    return ({
+        'line': line.number,
+        'message': 'Satır sonunda noktalı virgül (;) eksik',
+        'column': _token_end(last)
+    },)
+
+
+def check_invalid_operators(line: TokenLine):
+    for pattern in INVALID_OPERATORS:
+        for run, column in line.runs:
+            if pattern in run:
+                return ({
+                    'line': line.number,
+                    'message': f'Geçersiz operatör kullanımı: {pattern}',
+                    'column': column + run.find(pattern)
+                },)
+    return ()
+
+
+def check_declaration(line: TokenLine):
+    code = line.code
+    first = code[0]
+    if (first['type'] in WORD_TYPES and first['value'] in DECLARATION_TYPES and len(code) > 1 and
+            code[1]['column'] > _token_end(first) and
+            not ((line.has_open and line.has_close) or (_ends_statement(code[-1]) and _valid_declaration(code)))):
+        return ({
+            'line': line.number,
+            'message': 'Geçersiz değişken tanımlaması',
+            'column': 1
+        },)
+    return ()
+
+
+def check_brackets(source: Source):
+    tokens = source.tokens
+    positions = source.brackets.unmatched() if source.brackets is not None else unmatched_brackets(tokens)
+    unmatched = sorted((tokens[position] for position in positions),
+                       key=lambda token: (token['line'], BRACKET_ORDER[BRACKET_KINDS[token['value']]],
+                                          token['column']))
+    return [{
+        'line': token['line'],
+        'message': BRACKET_MESSAGES[BRACKET_ORDER[BRACKET_KINDS[token['value']]]][0],
+        'column': token['column']
+    } for token in unmatched]
+
+
+def check_duplicate_functions(source: Source):
+    # Every definition of a function name after its first one
+    errors = []
+    seen = set()
+    for node in source.tree.get('children', ()):
+        if node['type'] != 'function_declarations':
+            continue
+        for function in node['children']:
+            name_node = function['children'][1]
+            name = name_node['value']
+            if name in seen:
+                token = source.tokens[name_node.span[0]]
+                errors.append({
+                    'line': token['line'],
+                    'message': f'Fonksiyon birden fazla tanımlanmış: {name}',
+                    'column': token['column']
+                })
+            seen.add(name)
+    errors.sort(key=lambda error: error['line'])
+    return errors
+
+
+def default_rules() -> RuleRegistry:
+    """The rules of check_tokens(), in the order their diagnostics appear
+    on a line; cheap, cross-line checks have the highest priority."""
+    rules = RuleRegistry()
+    rules.register(Rule('semicolon', 'line', check_semicolon, priority=2))
+    rules.register(Rule('brackets', 'tokens', check_brackets, priority=3))
+    rules.register(Rule('invalid-operator', 'line', check_invalid_operators, priority=1))
+    rules.register(Rule('declaration', 'line', check_declaration, priority=1))
+    rules.register(Rule('duplicate-function', 'tree', check_duplicate_functions))
+    return rules
+
+
 class CSyntaxChecker:
     def __init__(self):
         
@@ -18,17 +227,130 @@ class CSyntaxChecker:
             '/=', '%=', '&=', '|=', '^=', '<<=', '>>='
         }
 
-    def check_syntax(self, code: str) -> List[Dict[str, any]]:
+        # State of check_lines(): the errors of every line of the text it
+        # checked last, as (message, column) pairs, and _check_line()
+        # results by line text.
+        self._line_errors = None
+        self._line_memo = {}
+        self.lines_checked = 0  # lines _check_line() ran on in the last check_lines()
+        # Rules of check_tokens(), and those its last run skipped for its budget
+        self.rules = default_rules()
+        self.skipped_rules = []
+        # Token list of the last check_tokens(), its length and last line,
+        # which an edit passed to the next call must start from
+        self._checked_tokens = None
+        self._checked_count = 0
+        self._checked_last_line = 0
+
+    def check_syntax(self, code: str, line_index: LineIndex = None) -> List[Dict[str, any]]:
+        """Checks every line of code; ``line_index`` may be passed to reuse
+        the line boundaries already computed for the same text."""
         errors = []
-        lines = code.split('\n')
+        if line_index is None:
+            line_index = LineIndex(code)
         
-        for line_num, line in enumerate(lines, 1):
-            
+        for line_num in range(1, line_index.line_count + 1):
+            line = line_index.line_text(code, line_num)
             line_errors = self._check_line(line, line_num)
             errors.extend(line_errors)
             
         return errors
 
+    def check_lines(self, code: str, line_index: LineIndex = None, edits=None) -> List[Dict[str, any]]:
+        """check_syntax(), rechecking only the lines edited since the last call.
+
+        ``edits`` are the ``(line, old_count, new_count)`` ranges returned by
+        LineIndex.apply_edit() for the edits, in order, that turned the
+        previously checked text into ``code``. The errors of other lines
+        are kept and renumbered. With ``edits`` None every line counts as
+        edited. Edited lines are looked up by their text first, so a line
+        that is only moved or restored (undo) is not checked again.
+        """
+        if line_index is None:
+            line_index = LineIndex(code)
+        line_count = line_index.line_count
+        line_errors = self._line_errors
+        if line_errors is None or edits is None:
+            line_errors = [None] * line_count
+        else:
+            for line, old_count, new_count in edits:
+                line_errors[line - 1:line - 1 + old_count] = [None] * new_count
+            if len(line_errors) != line_count:  # edits of some other text
+                line_errors = [None] * line_count
+        self._line_errors = line_errors
+
+        memo = self._line_memo
+        if len(memo) > 2 * line_count + 1024:
+            memo.clear()
+        self.lines_checked = 0
+        index = -1
+        while True:
+            try:
+                index = line_errors.index(None, index + 1)
+            except ValueError:
+                break
+            line = line_index.line_text(code, index + 1)
+            errors = memo.get(line)
+            if errors is None:
+                errors = memo[line] = tuple((error['message'], error['column'])
+                                            for error in self._check_line(line, index + 1))
+                self.lines_checked += 1
+            line_errors[index] = errors
+
+        return [{'line': line_num, 'message': message, 'column': column}
+                for line_num, errors in enumerate(line_errors, 1) if errors
+                for message, column in errors]
+
+    def check_tokens(self, tokens, brackets: BracketIndex = None, tree=None,
+                     budget: float = None, edit=None) -> List[Dict[str, any]]:
+        """check_syntax() over the tokens CLexer made of the code (a list or
+        a TokenStream) instead of its text, through the rules in ``rules``.
+
+        The tokens are read once, grouping them into lines for the line
+        rules. Since the rules see tokens, brackets and operators inside
+        strings or // comments no longer count, a trailing comment does not
+        hide a semicolon and 'if(' needs no space. Columns past the end of a
+        line are those of its last token rather than of trailing whitespace.
+
+        Brackets are matched across lines, through ``brackets`` if the
+        caller keeps a BracketIndex of the tokens: every unmatched one is
+        reported where it is. Tree rules run only when the parse ``tree``
+        is given. With a ``budget`` (seconds), rules left when it runs out
+        are skipped and named in ``skipped_rules``.
+
+        ``edit`` is the ``(first, old_stop, new_stop)`` CLexer.relex()
+        returned for the change to ``tokens`` (the same list) since the
+        previous call; the line rules then only go over the changed lines.
+        """
+        source = Source(tokens, token_lines, brackets, tree, self._line_edit(tokens, edit))
+        errors = self.rules.run(source, budget)
+        self.skipped_rules = self.rules.skipped
+        self._checked_tokens = tokens
+        self._checked_count = len(tokens)
+        self._checked_last_line = tokens[-1]['line'] if tokens else 0
+        return errors
+
+    def _line_edit(self, tokens, edit):
+        # Source.edit for a token edit, or None when the previous call did
+        # not check the tokens the edit started from
+        if edit is None or tokens is not self._checked_tokens:
+            return None
+        first, old_stop, new_stop = edit
+        if len(tokens) - (new_stop - old_stop) != self._checked_count:
+            return None
+        # relex() replaces whole lines, so the lines of the tokens around
+        # the edited ones are untouched; those after it moved as the last one did.
+        head = tokens[first - 1]['line'] if first else 0
+        if new_stop == len(tokens):
+            return first, new_stop, head, None, 0
+        line_delta = tokens[-1]['line'] - self._checked_last_line
+        return first, new_stop, head, tokens[new_stop]['line'] - line_delta, line_delta
+
+    def check_tree(self, tokens, tree) -> List[Dict[str, any]]:
+        """Diagnostics of the tree rules alone, for a ``tree`` parsed from
+        ``tokens`` after check_tokens() ran over them without one."""
+        return self.rules.run(Source(tokens, token_lines, tree=tree), scopes=('tree',))
+
     def _check_line(self, line: str, line_num: int) -> List[Dict[str, any]]:
         errors = []
         
@@ -208,31 +530,28 @@ class CSyntaxChecker:
             
         return True
 
-def highlight_errors(code_text_widget, errors: List[Dict[str, any]], add_error_callback=None):
+def highlight_errors(code_text_widget, errors: List[Dict[str, any]], add_errors_callback=None):
     """
     GUI'de hataları kırmızı renkte gösterir ve error listesine ekler
     
     Args:
         code_text_widget: GUI'deki text widget
         errors: Hata listesi (her hata için line, message ve column bilgisi içerir)
-        add_error_callback: GUI'nin error listesine hata eklemek için callback fonksiyonu
+        add_errors_callback: GUI'nin error listesine bütün hataları bir kerede
+            eklemek için callback fonksiyonu (CParserGUI.add_errors)
     """
 
     code_text_widget.tag_remove("error", "1.0", "end")
     
-  
-    for error in errors:
-        line = error['line']
+    # Hatalı her satır bir kez, hepsi tek bir tag_add çağrısıyla
+    ranges = []
+    for line in dict.fromkeys(error['line'] for error in errors):
+        ranges.extend((f"{line}.0", f"{line}.end"))
+    if ranges:
+        code_text_widget.tag_add("error", *ranges)
         
-        start_pos = f"{line}.0"
-        end_pos = f"{line}.end"
-        
-        
-        code_text_widget.tag_add("error", start_pos, end_pos)
-        
-        
-        if add_error_callback:
-            add_error_callback(error['message'], error['line'], error.get('column', 0))
-        else:
-            
-            print(f"Satır {line}: {error['message']}") 
\ No newline at end of file
+    if add_errors_callback:
+        add_errors_callback(errors)
+    else:
+        for error in errors:
+            print(f"Satır {error['line']}: {error['message']}")
@@ -1,12 +1,21 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import scrolledtext
-import re
-from Lexer import CLexer
-from Parser import Parser
+from Lexer import CLexer, find_edit
+from Parser import CancellationToken, Parser
 import math
 from typing import List, Dict, Any
+from collections.abc import Mapping
 from error import CSyntaxChecker, highlight_errors
+from brackets import BracketIndex, token_at
+from cache import AnalysisCache
+from ll1 import GRAMMAR
+
+# Seconds a parse may take before the parse tree shows only what was parsed
+PARSE_TIMEOUT = 3.0
+# Seconds the checker may take per keystroke before it skips its
+# lowest-priority rules
+CHECK_BUDGET = 0.25
 
 class Node:
     def __init__(self, value: str, children: List['Node'] = None):
@@ -108,6 +117,9 @@ class ParseTreeVisualizer:
             self._draw_node(child)
 
 class CCodeText(tk.Text):
+    TOKEN_TAGS = ('KEYWORD', 'IDENTIFIER', 'NUMBER', 'STRING', 'COMMENT',
+                  'PREPROCESSOR', 'OPERATOR', 'PARAMETER', 'ERROR')
+
     def __init__(self, master, gui_instance, *args, **kwargs):
         super().__init__(master, *args, **kwargs)
         
@@ -130,78 +142,160 @@ class CCodeText(tk.Text):
         self.tag_configure("COMMENT", foreground="#008080")  # Turkuaz
         self.tag_configure("PREPROCESSOR", foreground="#A020F0")  # Mor
         self.tag_configure("OPERATOR", foreground="#FF00FF")  # Magenta
+        self.tag_configure("ERROR", foreground="red", underline=True)  # Geçersiz karakter
         self.tag_configure("error", foreground="red", background="pink")  # Hata vurgulaması
+        self.tag_configure("bracket_match", background="#C8E6FF")  # İmlecin yanındaki parantez çifti
         
         
         self.syntax_checker = CSyntaxChecker()
+        
+        # Lexer and tokens of the last highlighted content, kept for relex()
+        self._lexer = None
+        self._tokens = None
+        # Token edit not yet taken by take_token_edit(): () for none, None
+        # when the tokens were rebuilt, else (first, old_stop, new_stop)
+        self._token_edit = None
+        # Bracket pairs of the tokens, for the checker and the cursor match
+        self.brackets = None
+        # AnalysisCache entry of the content when the tokens were rebuilt,
+        # for update_parse_tree(); None after an incremental change
+        self.analysis = None
+        self.bind('<KeyRelease>', self.highlight_matching_bracket, add='+')
+        self.bind('<ButtonRelease-1>', self.highlight_matching_bracket, add='+')
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    def take_token_edit(self):
+        """Returns how the tokens changed since the previous call: None if
+        they were rebuilt, () if unchanged, else ``(first, old_stop,
+        new_stop)`` as returned by CLexer.relex()."""
+        edit = self._token_edit
+        self._token_edit = ()
+        return edit
 
     def highlight_text(self, event=None):
-      
-        for tag in self.tag_names():
-            self.tag_remove(tag, "1.0", "end")
-        
        
         content = self.get("1.0", "end-1c")
         
         try:
-           
-            lexer = CLexer(content)
-            tokens = lexer.tokenize()
-                
+            analysis = None
+            if self._lexer is None:
+                for tag in self.TOKEN_TAGS + ('error',):
+                    self.tag_remove(tag, "1.0", "end")
                 
-            in_function_params = False
-            last_token_type = None
-            
-            
-            for i, token in enumerate(tokens):
-                if 'line' in token and 'column' in token and 'value' in token:
-                    
-                    start_pos = f"{token['line']}.{token['column'] - 1}"
-                    end_pos = f"{token['line']}.{token['column'] - 1 + len(token['value'])}"
-                    
-                    
-                    if token['value'] == '(':
-                        
-                        if (i > 0 and tokens[i-1]['type'] == 'IDENTIFIER' and 
-                            i > 1 and tokens[i-2]['type'] == 'KEYWORD'):
-                            in_function_params = True
-                    elif token['value'] == ')':
-                        in_function_params = False
-                    
-                    
-                    if token['type'] == 'STRING':
-                        
-                        self.tag_add('STRING', start_pos, end_pos)
-                        continue
-                    
-                    
-                    if in_function_params and token['type'] == 'IDENTIFIER':
-                        self.tag_add('PARAMETER', start_pos, end_pos)
-                        continue
-                    
-                    
-                    if token['type'] == 'PREPROCESSOR':
-                        self.tag_add('PREPROCESSOR', start_pos, end_pos)
-                    elif token['type'] == 'COMMENT':
-                        self.tag_add('COMMENT', start_pos, end_pos)
-                    elif token['type'] == 'NUMBER':
-                        self.tag_add('NUMBER', start_pos, end_pos)
-                    elif token['type'] == 'KEYWORD':
-                        self.tag_add('KEYWORD', start_pos, end_pos)
-                    elif token['type'] == 'OPERATOR':
-                        self.tag_add('OPERATOR', start_pos, end_pos)
-                    elif token['type'] == 'IDENTIFIER':
-                        self.tag_add('IDENTIFIER', start_pos, end_pos)
-                    
-                    last_token_type = token['type']
+                # Invalid characters become ERROR tokens, so the rest of the
+                # buffer stays highlighted and relex() keeps working.
+                self._lexer = CLexer(content, recover=True)
+                self._tokens = self._lexer.tokenize()
+                # relex() needs the lexer's own tokens and checkpoints; the
+                # tree and diagnostics of a text seen before come from the cache.
+                analysis = self.gui_instance.analysis_cache.get(content)
+                edit = None
+                self._token_edit = None
+                self.brackets = BracketIndex.from_tokens(self._tokens)
+                self._tag_tokens(0, len(self._tokens))
+            else:
+                # Only the lines between the resume checkpoint and the point
+                # where the token stream converges again need new tags.
+                offset, deleted_length, inserted_text = find_edit(self._lexer.text, content)
+                edit = first, old_stop, new_stop = self._lexer.relex(self._tokens, offset, deleted_length,
+                                                                      inserted_text)
+                self._merge_token_edit(first, old_stop, new_stop)
+                self.brackets.update(self._tokens, first, old_stop, new_stop)
+                start_line, stop_line = self._lexer.damaged_lines
+                stop_index = f"{stop_line}.0" if stop_line is not None else "end"
+                for tag in self.TOKEN_TAGS:
+                    self.tag_remove(tag, f"{start_line}.0", stop_index)
+                self._tag_tokens(first, new_stop)
+                # The checker, the parser and token_at() read every token's line
+                self._lexer.settle(self._tokens)
             
             
-            errors = self.syntax_checker.check_syntax(content)
+            self.analysis = analysis
+            if analysis is not None:
+                errors = analysis.errors
+            else:
+                # Given the edit, the checker only goes over the relexed lines
+                errors = self._lexer.diagnostics + self.syntax_checker.check_tokens(self._tokens, self.brackets,
+                                                                                    budget=CHECK_BUDGET, edit=edit)
             if errors:
-                highlight_errors(self, errors, self.gui_instance.add_error)
+                highlight_errors(self, errors, self.gui_instance.add_errors)
+            if analysis is None and self.syntax_checker.skipped_rules:
+                add_skipped_rules_error(self.gui_instance, self.syntax_checker)
                 
         except Exception as e:
+            self._lexer = None
+            self._tokens = None
+            self._token_edit = None
+            self.brackets = None
+            self.analysis = None
             print(f"Highlighting error: {e}")
+        self.highlight_matching_bracket()
+
+    def highlight_matching_bracket(self, event=None):
+        """Tags the bracket at the cursor (or just before it) and the one
+        matching it with 'bracket_match'."""
+        self.tag_remove('bracket_match', '1.0', 'end')
+        if self.brackets is None:
+            return
+        line, column = map(int, self.index('insert').split('.'))
+        for position in (token_at(self._tokens, line, column + 1), token_at(self._tokens, line, column)):
+            match = self.brackets.match(position) if position is not None else None
+            if match is not None:
+                for token in (self._tokens[position], self._tokens[match]):
+                    self.tag_add('bracket_match', f"{token['line']}.{token['column'] - 1}",
+                                 f"{token['line']}.{token['column']}")
+                return
+
+    def _merge_token_edit(self, first, old_stop, new_stop):
+        pending = self._token_edit
+        if pending == ():
+            self._token_edit = (first, old_stop, new_stop)
+        elif pending is not None:
+            # Union of both changed ranges, taken in the token list between
+            # the two edits and mapped back and forward through them.
+            pending_first, pending_old_stop, pending_new_stop = pending
+            stop = max(pending_new_stop, old_stop)
+            self._token_edit = (min(pending_first, first),
+                                stop - (pending_new_stop - pending_old_stop),
+                                stop + (new_stop - old_stop))
+
+    def _tag_tokens(self, first, stop):
+        tokens = self._tokens
+        in_function_params = False
+        
+        for i in range(first, stop):
+            token = tokens[i]
+            if 'line' in token and 'column' in token and 'value' in token:
+                
+                start_pos = f"{token['line']}.{token['column'] - 1}"
+                end_pos = f"{token['line']}.{token['column'] - 1 + len(token['value'])}"
+                
+                
+                if token['value'] == '(':
+                    
+                    if (i > 0 and tokens[i-1]['type'] == 'IDENTIFIER' and 
+                        i > 1 and tokens[i-2]['type'] == 'KEYWORD'):
+                        in_function_params = True
+                elif token['value'] == ')':
+                    in_function_params = False
+                
+                
+                if token['type'] == 'STRING':
+                    
+                    self.tag_add('STRING', start_pos, end_pos)
+                    continue
+                
+                
+                if in_function_params and token['type'] == 'IDENTIFIER':
+                    self.tag_add('PARAMETER', start_pos, end_pos)
+                    continue
+                
+                
+                if token['type'] in self.TOKEN_TAGS:
+                    self.tag_add(token['type'], start_pos, end_pos)
 
     def _is_function_declaration(self, tokens, current_index):
         
@@ -287,6 +381,25 @@ def update_tokens_tab():
             token['column']
         ))
 
+def add_parse_timeout_error(gui, parser):
+    token = parser.peek() or {'line': 1, 'column': 1, 'value': ''}
+    gui.add_error(f"Parser timeout - parse tree stops after {PARSE_TIMEOUT:g} seconds",
+                  token['line'], token['column'], token['value'])
+
+def add_skipped_rules_error(gui, checker):
+    gui.add_error(f"Checker rules skipped after {CHECK_BUDGET:g} seconds: {', '.join(checker.skipped_rules)}",
+                  1, 1, "")
+
+def add_tree_errors(gui, tokens, tree):
+    # highlight_text() checks the tokens before they are parsed, so the
+    # checker's tree rules run here, once the tree is there.
+    gui.add_errors(gui.text_editor.syntax_checker.check_tree(tokens, tree))
+
+def add_parse_errors(gui, errors):
+    # Errors the parser recovered from; the tree covers the rest of the file.
+    gui.add_errors([{'message': error.message, 'line': error.line, 'column': error.column,
+                     'token_value': error.token_value or ""} for error in errors])
+
 def update_parse_tree(self):
     
     self.parse_tree.delete(*self.parse_tree.get_children())
@@ -302,30 +415,16 @@ def update_parse_tree(self):
         
         
         if tokens:
-            parser = Parser(tokens)
+            parser = Parser(tokens, cancel_token=CancellationToken(PARSE_TIMEOUT))
             try:
+                tree_items = parser.parse()
                 
-                import threading
-                import _thread
-                
-                def timeout_handler():
-                    _thread.interrupt_main()
-                
-                
-                timer = threading.Timer(3.0, timeout_handler)
-                timer.start()
-                
-                try:
-                    tree_items = parser.parse()
-                    
-                    if tree_items:
-                        self._build_parse_tree(tree_items)
-                finally:
-                    
-                    timer.cancel()
+                if tree_items:
+                    self._build_parse_tree(tree_items)
+                add_parse_errors(self, parser.errors)
+                if parser.truncated:
+                    add_parse_timeout_error(self, parser)
                     
-            except KeyboardInterrupt:
-                self.add_error("Parser timeout - Code too complex or invalid", 1, 1, "")
             except Exception as e:
                 self.add_error(f"Parser error: {str(e)}", 1, 1, "")
         else:
@@ -349,6 +448,8 @@ class CParserGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("C Parser")
+        # Tokens, tree and diagnostics by content, for the editor's full rebuilds
+        self.analysis_cache = AnalysisCache()
         
         
         self.paned_window = ttk.PanedWindow(root, orient=tk.HORIZONTAL)
@@ -364,6 +465,8 @@ class CParserGUI:
         
         
         self.text_editor.bind('<<Modified>>', self.on_text_change)
+        # Parser over the editor's tokens, kept for Parser.reparse()
+        self._parser = None
         
         
         self.right_panel = ttk.Notebook(self.paned_window)
@@ -467,56 +570,8 @@ int main() {
         self.text_editor.tag_configure('error', background='pink')
 
     def load_grammar(self):
-        grammar_rules = """
-program → preprocessor* declaration*
-
-preprocessor → '#include' '<' HEADER '>'
-
-declaration → variable_declaration | function_declaration
-
-function_declaration → type IDENTIFIER '(' parameter_list? ')' block
-
-parameter_list → parameter (',' parameter)*
-parameter → type IDENTIFIER
-
-block → '{' statement* '}'
-
-statement → variable_declaration
-          | expression_statement
-          | if_statement
-          | while_statement
-          | for_statement
-          | return_statement
-          | block
-
-variable_declaration → type init_declarator (',' init_declarator)* ';'
-init_declarator → IDENTIFIER ('=' expression)?
-
-expression_statement → expression ';'
-
-expression → assignment
-
-assignment → IDENTIFIER '=' expression
-           | arithmetic_expression
-
-arithmetic_expression → term (('+' | '-' | '*' | '/' | '%') term)*
-
-term → IDENTIFIER
-     | NUMBER
-     | STRING
-     | '(' expression ')'
-     | function_call
-
-function_call → IDENTIFIER '(' argument_list? ')'
-argument_list → expression (',' expression)*
-
-if_statement → 'if' '(' expression ')' statement ('else' statement)?
-while_statement → 'while' '(' expression ')' statement
-for_statement → 'for' '(' expression? ';' expression? ';' expression? ')' statement
-return_statement → 'return' expression? ';'
-
-type → 'int' | 'char' | 'float' | 'double' | 'void'
-
+        # The rules come from ll1, whose parser is generated from them.
+        grammar_rules = GRAMMAR + """
 
 Lexer Token Tipleri:
 --------------------
@@ -535,46 +590,6 @@ HEADER        → [a-zA-Z0-9_/\.]+
         self.grammar_text.insert('1.0', grammar_rules)
         self.grammar_text.configure(state='disabled')
 
-    def highlight_syntax(self):
-        content = self.text_editor.get("1.0", tk.END)
-        self.text_editor.tag_remove("keyword", "1.0", tk.END)
-        self.text_editor.tag_remove("string", "1.0", tk.END)
-        self.text_editor.tag_remove("comment", "1.0", tk.END)
-        self.text_editor.tag_remove("preprocessor", "1.0", tk.END)
-        self.text_editor.tag_remove("number", "1.0", tk.END)
-        self.text_editor.tag_remove("operator", "1.0", tk.END)
-        
-        
-        keywords = r'\b(int|char|float|double|void|if|else|while|for|return)\b'
-        self.highlight_pattern(keywords, 'keyword')
-        
-        
-        strings = r'"[^"]*"'
-        self.highlight_pattern(strings, 'string')
-        
-        
-        comments = r'//[^\n]*'
-        self.highlight_pattern(comments, 'comment')
-        
-        
-        preprocessor = r'#[^\n]*'
-        self.highlight_pattern(preprocessor, 'preprocessor')
-        
-       
-        numbers = r'\b\d+\b'
-        self.highlight_pattern(numbers, 'number')
-        
-        
-        operators = r'[+\-*/%=<>!&|^~]'
-        self.highlight_pattern(operators, 'operator')
-
-    def highlight_pattern(self, pattern, tag):
-        content = self.text_editor.get("1.0", tk.END)
-        for match in re.finditer(pattern, content):
-            start = f"1.0+{match.start()}c"
-            end = f"1.0+{match.end()}c"
-            self.text_editor.tag_add(tag, start, end)
-
     def update_tokens(self):
         
         self.token_tree.delete(*self.token_tree.get_children())
@@ -582,18 +597,17 @@ HEADER        → [a-zA-Z0-9_/\.]+
         try:
             
             content = self.text_editor.get("1.0", "end-1c")
-            lexer = CLexer(content)
-            tokens = lexer.tokenize()
+            lexer = CLexer(content, engine='regex')
+            tokens = lexer.tokenize_stream()
             
        
-            for token in tokens:
-                if 'type' in token and 'value' in token and 'line' in token and 'column' in token:
-                    self.token_tree.insert('', 'end', values=(
-                        token['type'],
-                        token['value'],
-                        token['line'],
-                        token['column']
-                    ))
+            for i in range(len(tokens)):
+                self.token_tree.insert('', 'end', values=(
+                    tokens.type(i),
+                    tokens.value(i),
+                    tokens.lines[i],
+                    tokens.columns[i]
+                ))
         except Exception as e:
             self.add_error("Lexer error", 1, 1, str(e))
 
@@ -604,38 +618,51 @@ HEADER        → [a-zA-Z0-9_/\.]+
         try:
             # Get code and create lexer
             code = self.text_editor.get("1.0", "end-1c")
+            edit = self.text_editor.take_token_edit()
             if not code.strip():  # If code is empty or only whitespace
                 return
-                
-            lexer = CLexer(code)
-            tokens = lexer.tokenize()
             
+            # Reuse the editor's tokens, which relex() keeps current, so
+            # that an edit only reparses the functions it touched.
+            tokens = self.text_editor.tokens
+            if tokens is None:
+                lexer = CLexer(code)
+                tokens = lexer.tokenize()
+            
+            analysis = self.text_editor.analysis
+            if analysis is not None and edit is None:
+                # The cache's errors already include the tree rules'; a
+                # cached tree is shared, so the next edit parses afresh.
+                self._parser = None
+                if analysis.tokens:
+                    self._build_parse_tree(analysis.tree)
+                    add_parse_errors(self, analysis.parse_errors)
+                else:
+                    self.add_error("No valid tokens to parse", 1, 1, "")
             # Only try to parse if we have valid tokens
-            if tokens:
-                parser = Parser(tokens)
+            elif tokens:
+                # The parser checks the deadline between statements and
+                # returns the tree parsed so far instead of being interrupted.
+                cancel_token = CancellationToken(PARSE_TIMEOUT)
+                parser = self._parser
                 try:
-                    # Set a timeout for parsing (3 seconds)
-                    import threading
-                    import _thread
-                    
-                    def timeout_handler():
-                        _thread.interrupt_main()
-                    
-                    # Start timeout timer
-                    timer = threading.Timer(3.0, timeout_handler)
-                    timer.start()
-                    
-                    try:
+                    if parser is not None and parser.tokens is tokens and edit is not None:
+                        parser.cancel_token = cancel_token
+                        # () means the tokens are unchanged since the last parse
+                        tree_items = parser.reparse(*(edit or (0, 0, 0)))
+                    else:
+                        parser = Parser(tokens, cancel_token=cancel_token)
                         tree_items = parser.parse()
-                        # Build tree only if parsing was successful
-                        if tree_items:
-                            self._build_parse_tree(tree_items)
-                    finally:
-                        # Cancel timer
-                        timer.cancel()
+                    self._parser = parser
+                    # Build tree only if parsing was successful
+                    if tree_items:
+                        self._build_parse_tree(tree_items)
+                    add_parse_errors(self, parser.errors)
+                    if tree_items:
+                        add_tree_errors(self, tokens, tree_items)
+                    if parser.truncated:
+                        add_parse_timeout_error(self, parser)
                         
-                except KeyboardInterrupt:
-                    self.add_error("Parser timeout - Code too complex or invalid", 1, 1, "")
                 except Exception as e:
                     self.add_error(f"Parser error: {str(e)}", 1, 1, "")
             else:
@@ -643,20 +670,15 @@ HEADER        → [a-zA-Z0-9_/\.]+
                 
         except Exception as e:
             self.add_error(f"Lexer error: {str(e)}", 1, 1, "")
-            
-        finally:
-            # Always ensure the error tab is visible if there are errors
-            if len(self.error_tree.get_children()) > 0:
-                self.right_panel.select(3)  # Switch to errors tab
 
     def _build_parse_tree(self, items, parent=''):
         """Build the parse tree in the treeview widget"""
-        if isinstance(items, dict):
+        if isinstance(items, Mapping):  # dict or the parser's NodeView
             # Create node text based on the type and value
             node_text = items.get('type', 'unknown')
             
             
-            if items['type'] == 'arithmetic_operation':
+            if items['type'] in ('arithmetic_operation', 'unary_operation', 'postfix_operation'):
                 
                 node_id = self.parse_tree.insert(parent, 'end', text=items['operator'])
                 
@@ -665,6 +687,9 @@ HEADER        → [a-zA-Z0-9_/\.]+
                         self._build_parse_tree(child, node_id)
                 return
             
+            if items['type'] == 'function_call':
+                node_text += f": {items['function_name']}"
+            
             if 'value' in items:
                 if items['type'] == 'function_name':
                     node_text = items['value']  
@@ -759,24 +784,32 @@ HEADER        → [a-zA-Z0-9_/\.]+
             
             self.update_parse_tree()
             
-            
+            # Once for all the errors of the change, not per error
+            self.show_errors()
             self.text_editor.edit_modified(False)
 
     def add_error(self, message, line, column, token_value=None):
         """Hata listesine yeni bir hata ekler"""
-        self.error_tree.insert('', 'end', values=(message, line, column, token_value))
-        self.highlight_error(line, column)
-        self.right_panel.select(3)  # 3 = Errors tab
-
-    def highlight_error(self, line, column):
-        """Belirtilen konumdaki hatayı vurgular"""
-       
-        self.text_editor.tag_remove('error', '1.0', 'end')
-        
+        self.add_errors([{'message': message, 'line': line, 'column': column, 'token_value': token_value}])
 
-        start = f"{line}.{column}"
-        end = f"{line}.{column + 1}"
-        self.text_editor.tag_add('error', start, end)
+    def add_errors(self, errors):
+        """Hata listesine birden çok hatayı bir kerede ekler: satırlar art
+        arda eklenir, bütün hata konumları tek bir tag_add ile vurgulanır.
+        Errors sekmesine show_errors() geçer"""
+        if not errors:
+            return
+        insert = self.error_tree.insert
+        ranges = []
+        for error in errors:
+            line, column = error['line'], error.get('column', 0)
+            insert('', 'end', values=(error['message'], line, column, error.get('token_value')))
+            ranges.extend((f"{line}.{column}", f"{line}.{column + 1}"))
+        self.text_editor.tag_add('error', *ranges)
+
+    def show_errors(self):
+        """Hata varsa Errors sekmesine geçer"""
+        if self.error_tree.get_children():
+            self.right_panel.select(3)  # 3 = Errors tab
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -784,5 +817,6 @@ if __name__ == "__main__":
     app.text_editor.highlight_text()
     app.update_tokens()
     app.update_parse_tree()
+    app.show_errors()
     app.text_editor.edit_modified(False)
     root.mainloop()
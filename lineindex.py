@@ -0,0 +1,94 @@
+from bisect import bisect_right
+from typing import Tuple
+
+
+class LineIndex:
+    """Sorted offsets of every line start of a text.
+
+    Converts between character offsets and 1-based (line, column) pairs, as
+    used by CLexer tokens, with a binary search instead of a walk from the
+    start of the text, and can be kept in sync with edits.
+
+    apply_edit() leaves the line starts after an edit as they were and
+    records the pending shift instead: ``starts`` from ``shift_from`` on are
+    behind by ``shift``. Every lookup below adds it.
+    """
+
+    def __init__(self, text: str = ''):
+        starts = [0]
+        newline = text.find('\n')
+        while newline != -1:
+            starts.append(newline + 1)
+            newline = text.find('\n', newline + 1)
+        self.starts = starts
+        self.length = len(text)
+        self.shift_from = len(starts)
+        self.shift = 0
+
+    @property
+    def line_count(self) -> int:
+        return len(self.starts)
+
+    def line_start(self, line: int) -> int:
+        start = self.starts[line - 1]
+        return start + self.shift if line > self.shift_from else start
+
+    def line_end(self, line: int) -> int:
+        """Offset of the newline ending ``line`` (or of the end of the text)."""
+        return self.line_start(line + 1) - 1 if line < len(self.starts) else self.length
+
+    def line_text(self, text: str, line: int) -> str:
+        return text[self.line_start(line):self.line_end(line)]
+
+    def _line(self, offset: int, lo: int = 0) -> int:
+        # Number of line starts up to ``offset``, searching those before and
+        # after shift_from apart
+        starts, shift_from = self.starts, self.shift_from
+        line = bisect_right(starts, offset, lo, max(shift_from, lo))
+        if line < shift_from:
+            return line
+        return bisect_right(starts, offset - self.shift, max(shift_from, lo))
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        line = self._line(offset)
+        return line, offset - self.line_start(line) + 1
+
+    def offset(self, line: int, column: int = 1) -> int:
+        return self.line_start(line) + column - 1
+
+    def tk_index(self, offset: int) -> str:
+        """Tk text index ("line.char", 0-based char) of an offset."""
+        line, column = self.position(offset)
+        return f"{line}.{column - 1}"
+
+    def apply_edit(self, offset: int, deleted_length: int, inserted_text: str) -> Tuple[int, int, int]:
+        """Updates the index for an edit of the text it was built from.
+
+        Returns ``(line, old_count, new_count)``: lines ``line`` to
+        ``line + old_count - 1`` of the old text were replaced by ``new_count``
+        lines.
+        """
+        starts = self.starts
+        first = self._line(offset)
+        last = self._line(offset + deleted_length, first)
+        delta = len(inserted_text) - deleted_length
+
+        inserted = []
+        newline = inserted_text.find('\n')
+        while newline != -1:
+            inserted.append(offset + newline + 1)
+            newline = inserted_text.find('\n', newline + 1)
+
+        # The pending shift is moved to the replaced lines (as far as the
+        # previous edit is from them) and this edit's shift added to it.
+        shift_from = min(max(self.shift_from, first), last)
+        if self.shift:
+            for index in range(self.shift_from, shift_from):
+                starts[index] += self.shift
+            for index in range(shift_from, self.shift_from):
+                starts[index] -= self.shift
+        starts[first:last] = inserted
+        self.shift_from = first + len(inserted)
+        self.shift += delta
+        self.length += delta
+        return first, last - first + 1, len(inserted) + 1
@@ -0,0 +1,474 @@
+"""Table-driven LL(1) parser generated from the grammar in the Grammar tab.
+
+GRAMMAR is the EBNF text CParserGUI.load_grammar displays. build_table()
+reads it into a dict of productions, replaces ``*``, ``?`` and groups with
+helper nonterminals, left-factors the alternatives that start alike (the
+declaration, assignment and term rules) and computes FIRST/FOLLOW sets to
+fill the parse table. The only conflict left, the dangling 'else', goes to
+the non-empty alternative as in C. load_table() caches the table as JSON,
+keyed by a hash of the grammar, so it is only built once.
+
+LL1Parser runs the table with an explicit stack; nodes of helper
+nonterminals are dissolved into their parent, so the tree only holds rules
+of the documented grammar (a rule that was inlined while left-factoring,
+e.g. function_call inside term, appears as the tokens it matched).
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+from Parser import SyntaxError
+
+GRAMMAR = """
+program → preprocessor* declaration*
+
+preprocessor → '#include' '<' HEADER '>'
+
+declaration → variable_declaration | function_declaration
+
+function_declaration → type IDENTIFIER '(' parameter_list? ')' block
+
+parameter_list → parameter (',' parameter)*
+parameter → type IDENTIFIER
+
+block → '{' statement* '}'
+
+statement → variable_declaration
+          | expression_statement
+          | if_statement
+          | while_statement
+          | for_statement
+          | return_statement
+          | block
+
+variable_declaration → type init_declarator (',' init_declarator)* ';'
+init_declarator → IDENTIFIER ('=' expression)?
+
+expression_statement → expression ';'
+
+expression → assignment
+
+assignment → IDENTIFIER '=' expression
+           | arithmetic_expression
+
+arithmetic_expression → term (('+' | '-' | '*' | '/' | '%') term)*
+
+term → IDENTIFIER
+     | NUMBER
+     | STRING
+     | '(' expression ')'
+     | function_call
+
+function_call → IDENTIFIER '(' argument_list? ')'
+argument_list → expression (',' expression)*
+
+if_statement → 'if' '(' expression ')' statement ('else' statement)?
+while_statement → 'while' '(' expression ')' statement
+for_statement → 'for' '(' expression? ';' expression? ';' expression? ')' statement
+return_statement → 'return' expression? ';'
+
+type → 'int' | 'char' | 'float' | 'double' | 'void'
+"""
+
+END = '$'
+CLOSE = None  # stack entry that ends the current rule node
+# Token types matched by name; every other token is matched by its value
+NAMED_TERMINALS = ('IDENTIFIER', 'NUMBER', 'STRING', 'HEADER')
+INCLUDE_RE = re.compile(r'#\s*include\s*<\s*([a-zA-Z0-9_/.]+)\s*>$')
+TABLE_VERSION = 1
+# Besides matching, a token may take a chain of rule expansions (expression,
+# assignment, ...) and the ends of their nodes; about 5 steps in practice.
+STEPS_PER_TOKEN = 16
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'll1_table.json')
+EBNF_TOKEN_RE = re.compile(r"\s*('[^']*'|[A-Za-z_]\w*|[()|*?+])")
+
+
+class GrammarError(Exception):
+    pass
+
+
+def is_terminal(symbol: str) -> bool:
+    return symbol.startswith("'") or symbol in NAMED_TERMINALS
+
+
+def read_grammar(text: str = GRAMMAR):
+    """Reads EBNF rules (``name → alternatives``, continued on lines that
+    start with '|') into ``(start, rules, helpers)``. rules maps each name
+    to a list of alternatives in plain BNF, tuples of symbols; helpers are
+    the rules added for the EBNF operators and groups."""
+    sources = []
+    for line in text.splitlines():
+        if '→' in line:
+            name, body = line.split('→', 1)
+            sources.append((name.strip(), body))
+        elif line.strip():
+            sources[-1] = (sources[-1][0], sources[-1][1] + ' ' + line)
+    rules = {}
+    helpers = set()
+
+    def helper(owner, alternatives):
+        name = _helper_name(owner, helpers)
+        rules[name] = alternatives
+        return name
+
+    for owner, body in sources:
+        tokens = EBNF_TOKEN_RE.findall(body)
+        pos = 0
+
+        # A small recursive-descent reader; grammars nest only a few levels.
+        def alternatives():
+            nonlocal pos
+            result = [sequence()]
+            while pos < len(tokens) and tokens[pos] == '|':
+                pos += 1
+                result.append(sequence())
+            return result
+
+        def sequence():
+            nonlocal pos
+            symbols = []
+            while pos < len(tokens) and tokens[pos] not in ('|', ')'):
+                if tokens[pos] == '(':
+                    pos += 1
+                    group = alternatives()
+                    if pos >= len(tokens) or tokens[pos] != ')':
+                        raise GrammarError(f"unbalanced '(' in rule {owner}")
+                    pos += 1
+                    symbol = group[0][0] if len(group) == 1 and len(group[0]) == 1 else helper(owner, group)
+                else:
+                    symbol = tokens[pos]
+                    pos += 1
+                if pos < len(tokens) and tokens[pos] in '*?+':
+                    operator = tokens[pos]
+                    pos += 1
+                    if operator == '+':
+                        symbols.append(symbol)
+                    repeat = helper(owner, [])
+                    rules[repeat] += [(symbol, repeat) if operator != '?' else (symbol,), ()]
+                    symbol = repeat
+                symbols.append(symbol)
+            return tuple(symbols)
+
+        rules[owner] = alternatives()
+        if pos != len(tokens):
+            raise GrammarError(f'unexpected {tokens[pos]!r} in rule {owner}')
+    for name, productions in rules.items():
+        for symbol in (s for production in productions for s in production):
+            if not is_terminal(symbol) and symbol not in rules:
+                raise GrammarError(f'rule {name} uses undefined {symbol!r}')
+    return sources[0][0], rules, helpers
+
+
+def _helper_name(owner, helpers):
+    # owner__1, owner__2, ...; '__' never occurs in the grammar's own names
+    name = f'{owner}__{sum(1 for h in helpers if h.rsplit("__", 1)[0] == owner) + 1}'
+    helpers.add(name)
+    return name
+
+
+def first_sets(rules) -> Dict[str, set]:
+    """FIRST set of every nonterminal; '' stands for the empty string."""
+    first = {name: set() for name in rules}
+    changed = True
+    while changed:
+        changed = False
+        for name, productions in rules.items():
+            for production in productions:
+                before = len(first[name])
+                first[name] |= sequence_first(production, first)
+                changed |= len(first[name]) != before
+    return first
+
+
+def sequence_first(symbols, first) -> set:
+    result = set()
+    for symbol in symbols:
+        if is_terminal(symbol):
+            result.add(symbol)
+            return result
+        result |= first[symbol] - {''}
+        if '' not in first[symbol]:
+            return result
+    result.add('')
+    return result
+
+
+def follow_sets(start, rules, first) -> Dict[str, set]:
+    follow = {name: set() for name in rules}
+    follow[start].add(END)
+    changed = True
+    while changed:
+        changed = False
+        for name, productions in rules.items():
+            for production in productions:
+                for i, symbol in enumerate(production):
+                    if is_terminal(symbol):
+                        continue
+                    rest = sequence_first(production[i + 1:], first)
+                    before = len(follow[symbol])
+                    follow[symbol] |= rest - {''}
+                    if '' in rest:
+                        follow[symbol] |= follow[name]
+                    changed |= len(follow[symbol]) != before
+    return follow
+
+
+def left_factor(rules, helpers, limit: int = 1000):
+    """Rewrites alternatives of a rule whose FIRST sets overlap: a common
+    leading symbol is factored into a helper rule, and a leading
+    nonterminal is first replaced by its own alternatives (preferring one
+    that derives another alternative's leading symbol, so that for
+    ``A → type ... | function_declaration`` function_declaration is
+    replaced rather than type)."""
+    for _ in range(limit):
+        first = first_sets(rules)
+        conflict = _find_conflict(rules, first)
+        if conflict is None:
+            return
+        name, group = conflict
+        productions = rules[name]
+        leads = {productions[i][0] for i in group}
+        if len(leads) == 1:
+            prefix = _common_prefix([productions[i] for i in group])
+            factored = _helper_name(name, helpers)
+            rules[factored] = [productions[i][len(prefix):] for i in group]
+            rules[name] = [p for i, p in enumerate(productions) if i not in group]
+            rules[name].insert(min(group), prefix + (factored,))
+        else:
+            candidates = [i for i in group if not is_terminal(productions[i][0]) and productions[i][0] != name]
+            i = next((i for i in candidates if leads & _leading_symbols(rules, productions[i][0])), candidates[0])
+            inlined = [p + productions[i][1:] for p in rules[productions[i][0]]]
+            rules[name] = productions[:i] + inlined + productions[i + 1:]
+    raise GrammarError('left factoring does not terminate')
+
+
+def _leading_symbols(rules, name):
+    # Symbols that can start a string derived from ``name`` (other than itself)
+    found = set()
+    pending = [name]
+    while pending:
+        for production in rules[pending.pop()]:
+            if production and production[0] not in found:
+                found.add(production[0])
+                if not is_terminal(production[0]):
+                    pending.append(production[0])
+    found.discard(name)
+    return found
+
+
+def _find_conflict(rules, first):
+    for name, productions in rules.items():
+        seen = {}
+        for i, production in enumerate(productions):
+            for terminal in sequence_first(production, first) - {''}:
+                if terminal in seen:
+                    return name, sorted(j for j, p in enumerate(productions)
+                                        if terminal in sequence_first(p, first))
+                seen[terminal] = i
+    return None
+
+
+def _common_prefix(productions):
+    prefix = []
+    for symbols in zip(*productions):
+        if len(set(symbols)) != 1:
+            break
+        prefix.append(symbols[0])
+    return tuple(prefix)
+
+
+def build_table(text: str = GRAMMAR) -> Dict[str, Any]:
+    """Builds the parse table of ``text`` as a JSON-ready dict."""
+    start, rules, helpers = read_grammar(text)
+    left_factor(rules, helpers)
+    first = first_sets(rules)
+    follow = follow_sets(start, rules, first)
+    table = {}
+    for name, productions in rules.items():
+        row = table[name] = {}
+        for i, production in enumerate(productions):
+            lookahead = sequence_first(production, first)
+            if '' in lookahead:
+                lookahead = (lookahead - {''}) | follow[name]
+            for terminal in lookahead:
+                if terminal in row:
+                    # Left factoring leaves only clashes between an empty and
+                    # a non-empty alternative (the dangling 'else'); the
+                    # non-empty one wins.
+                    nullable = '' in sequence_first(production, first)
+                    if nullable == ('' in sequence_first(productions[row[terminal]], first)):
+                        raise GrammarError(f'{name} is not LL(1) on {terminal}')
+                    if nullable:
+                        continue
+                row[terminal] = i
+    return {
+        'key': grammar_key(text),
+        'start': start,
+        'helpers': sorted(helpers),
+        'rules': {name: [list(p) for p in productions] for name, productions in rules.items()},
+        'follow': {name: sorted(terminals) for name, terminals in follow.items()},
+        'table': table
+    }
+
+
+def grammar_key(text: str) -> str:
+    return hashlib.sha256(f'{TABLE_VERSION}\n{text}'.encode('utf-8')).hexdigest()
+
+
+def load_table(text: str = GRAMMAR, path: str = DEFAULT_TABLE_PATH) -> Dict[str, Any]:
+    """The parse table of ``text``, read from ``path`` if it was cached
+    there for the same grammar, else built and written to ``path``."""
+    key = grammar_key(text)
+    if path is not None:
+        try:
+            with open(path, encoding='utf-8') as f:
+                table = json.load(f)
+            if table.get('key') == key:
+                return table
+        except (OSError, ValueError):
+            pass
+    table = build_table(text)
+    if path is not None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(table, f)
+        except OSError:
+            pass  # a read-only install just rebuilds the table next time
+    return table
+
+
+def token_terminals(token: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """``(terminal, value)`` pairs a lexer token stands for. Terminals are
+    spelled without quotes ('int' is int, IDENTIFIER stays IDENTIFIER); an
+    include line, a single PREPROCESSOR token, becomes #include < HEADER >."""
+    kind = token['type']
+    if kind in NAMED_TERMINALS:
+        return [(kind, token['value'])]
+    if kind == 'PREPROCESSOR':
+        match = INCLUDE_RE.match(token['value'])
+        if match:
+            return [('#include', '#include'), ('<', '<'), ('HEADER', match.group(1)), ('>', '>')]
+        return [(kind, token['value'])]
+    if kind == 'COMMENT':
+        return []
+    if kind == 'ERROR':
+        return [(kind, token['value'])]
+    return [(token['value'], token['value'])]
+
+
+def _unquote(symbol: str) -> str:
+    return symbol[1:-1] if symbol.startswith("'") else symbol
+
+
+def _describe(terminal: str) -> str:
+    # Grammar spelling of a terminal, for error messages
+    return terminal if terminal in NAMED_TERMINALS or terminal in (END, 'PREPROCESSOR', 'ERROR') else f"'{terminal}'"
+
+
+class LL1Parser:
+    """Parses a token list with a table from load_table().
+
+    parse() returns the tree as nested dicts, ``{'type': rule, 'children':
+    [...]}`` with the matched tokens as ``{'type': token type, 'value': ...}``
+    leaves, and records syntax errors in ``errors``. After an error it
+    recovers in panic mode: a missing terminal is assumed to be there, and a
+    token that no alternative of the current rule starts with is skipped,
+    unless the rule may be followed by it or a rule further down the stack
+    can use it. Further errors are only reported once a token was matched.
+    """
+
+    def __init__(self, tokens: List[Dict[str, Any]], table: Dict[str, Any] = None,
+                 steps_per_token: int = STEPS_PER_TOKEN):
+        self.tokens = tokens
+        self.table = table if table is not None else load_table()
+        self.errors = []
+        self.steps_per_token = steps_per_token
+        rules = self.table['rules']
+        helpers = set(self.table['helpers'])
+        # rule -> terminal -> (symbols to push, in reverse order; whether the
+        # rule is a helper whose node is dissolved into its parent)
+        self.expansions = {
+            name: {_unquote(terminal): (tuple(_unquote(s) for s in reversed(rules[name][i])), name in helpers)
+                   for terminal, i in row.items()}
+            for name, row in self.table['table'].items()}
+        self.follow = {name: {_unquote(t) for t in terminals} for name, terminals in self.table['follow'].items()}
+
+    def _input(self):
+        # (terminal, value, token) triples, ending with END.
+        for token in self.tokens:
+            kind = token['type']
+            if kind in NAMED_TERMINALS:
+                yield kind, token['value'], token
+            elif kind in ('PREPROCESSOR', 'COMMENT', 'ERROR'):
+                for terminal, value in token_terminals(token):
+                    yield terminal, value, token
+            else:
+                yield token['value'], token['value'], token
+        yield END, None, None
+
+    def parse(self) -> Dict[str, Any]:
+        self.errors = []
+        expansions = self.expansions
+        follow = self.follow
+        root = {'children': []}
+        # Rule nodes are closed by a CLOSE entry pushed below their symbols,
+        # which brings back the parent's children list from ``parents``.
+        stack = [END, self.table['start']]
+        parents = []
+        children = root['children']
+        tokens = self._input()
+        terminal, value, token = next(tokens)
+        last = {'line': 1, 'column': 1}
+        recovering = False
+        max_steps = self.steps_per_token * (len(self.tokens) + 4) + 16
+        steps = 0
+        while stack:
+            steps += 1
+            if steps > max_steps:
+                raise Exception("LL(1) parser step budget exceeded")
+            symbol = stack.pop()
+            row = expansions.get(symbol)
+            if row is None:
+                if symbol is CLOSE:
+                    children = parents.pop()
+                elif symbol == terminal:
+                    if symbol == END:
+                        break
+                    children.append({'type': token['type'], 'value': value})
+                    recovering = False
+                    last = token
+                    terminal, value, token = next(tokens)
+                elif not recovering:
+                    # Go on as if the missing terminal were there.
+                    self._error(f"Expected {_describe(symbol)}", token or last, value)
+                    recovering = True
+                continue
+            expansion = row.get(terminal)
+            if expansion is None:
+                if not recovering:
+                    expected = ', '.join(sorted(_describe(t) for t in row))
+                    self._error(f"Unexpected {_describe(terminal)} in {symbol.split('__')[0]}, expected one of {expected}",
+                                token or last, value)
+                    recovering = True
+                if (terminal != END and terminal not in follow[symbol] and
+                        not any(s == terminal or terminal in expansions.get(s, ()) for s in stack)):
+                    # Skip the token and try the rule again.
+                    stack.append(symbol)
+                    last = token
+                    terminal, value, token = next(tokens)
+                continue
+            symbols, dissolve = expansion
+            if not dissolve:
+                node = {'type': symbol, 'children': []}
+                children.append(node)
+                parents.append(children)
+                children = node['children']
+                stack.append(CLOSE)
+            stack.extend(symbols)
+        return root['children'][0] if root['children'] else {'type': self.table['start'], 'children': []}
+
+    def _error(self, message, token, value):
+        self.errors.append(SyntaxError(message, token.get('line', 1), token.get('column', 1), value))
@@ -0,0 +1,187 @@
+"""NumPy engine for CLexer (``CLexer(text, engine='numpy')``).
+
+The source is viewed as a uint8 array and every byte is classified in one
+vectorized step. Identifier, number and single-character tokens are then
+found with array operations over those classes; only strings, comments and
+preprocessor lines, whose extent depends on what came before them, are
+walked in Python. Non-ASCII sources, and sources with invalid characters
+when the lexer recovers from them, are handed to the regex engine.
+"""
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("engine='numpy' requires NumPy (pip install numpy)") from e
+
+from Lexer import KEYWORDS, TOKEN_RE
+from symbols import NO_SYMBOL, PUNCTUATION_IDS
+from tokenstream import TokenStream, TOKEN_TYPES, TYPE_CODES
+
+
+def _table(chars):
+    table = np.zeros(256, dtype=bool)
+    table[list(chars.encode('ascii'))] = True
+    return table
+
+SPACE = _table(' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f')
+DIGIT = _table('0123456789')
+WORD_START = _table('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+WORD = WORD_START | DIGIT
+NUMBER = DIGIT | _table('.')
+PUNCT_CODES = np.full(256, -1, dtype=np.int8)
+for _chars, _type in (('+-*/%=<>!&|^~', 'OPERATOR'), ('(){}[]', 'DELIMITER'), (';,', 'SEPARATOR')):
+    PUNCT_CODES[list(_chars.encode('ascii'))] = TYPE_CODES[_type]
+PUNCT = PUNCT_CODES >= 0
+PUNCT_SYMBOLS = np.full(256, NO_SYMBOL, dtype=np.int64)
+for _spelling, _symbol in PUNCTUATION_IDS.items():
+    PUNCT_SYMBOLS[ord(_spelling)] = _symbol
+VALID = SPACE | WORD | PUNCT | _table('."#')
+
+IDENTIFIER = TYPE_CODES['IDENTIFIER']
+KEYWORD = TYPE_CODES['KEYWORD']
+
+
+def scan(lexer):
+    """Returns ``(kinds, starts, value_starts, value_ends, symbols)`` arrays
+    in token order.
+
+    ``starts`` is where each token begins; the value spans and symbol IDs
+    (from ``lexer.symbols``) follow the TokenStream convention. Raises the
+    scanner's error for the first invalid character, or returns None for a
+    recovering lexer.
+    """
+    text = lexer.text
+    n = len(text)
+    a = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    padded = np.append(a, 0)  # lets lookups at end-of-run positions hit n
+
+    # Strings, comments and preprocessor lines: every '"', '#' or '//' that
+    # is not already inside one of them starts a new one.
+    double_slash = (a == 47) & (padded[1:] == 47)
+    candidates = np.flatnonzero((a == 34) | (a == 35) | double_slash).tolist()
+    special = ([], [], [], [], [])
+    covered = 0
+    match = TOKEN_RE.match
+    for pos in candidates:
+        if pos < covered:
+            continue
+        m = match(text, pos)
+        kind = m.lastgroup
+        if kind == 'STRING':
+            value_start, value_end = m.span('STRING_BODY')
+        elif kind == 'COMMENT':
+            value_start, value_end = m.span('COMMENT_TEXT')
+        else:
+            value_start, value_end = pos, pos + len(m.group(kind).rstrip())
+        covered = m.end()
+        for column, value in zip(special, (TYPE_CODES[kind], pos, covered, value_start, value_end)):
+            column.append(value)
+    special_kinds, special_starts, special_ends, special_value_starts, special_value_ends = (
+        np.array(column, dtype=np.int64) for column in special)
+
+    coverage = np.zeros(n + 1, dtype=np.int32)
+    np.add.at(coverage, special_starts, 1)
+    np.add.at(coverage, special_ends, -1)
+    plain = np.cumsum(coverage[:n]) == 0
+
+    # Single-character operators, delimiters and separators
+    punct_starts = np.flatnonzero(PUNCT[a] & plain)
+    punct_kinds = PUNCT_CODES[a[punct_starts]].astype(np.int64)
+
+    # Runs of word characters and dots hold at most a number followed by an
+    # identifier ("12ab"); a dot anywhere else is an invalid character.
+    runs = (WORD[a] | (a == 46)) & plain
+    run_starts = np.flatnonzero(runs & ~np.concatenate(([False], runs[:-1])))
+    first = a[run_starts]
+    non_word = np.append(np.flatnonzero(~WORD[a]), n)
+    non_number = np.append(np.flatnonzero(~NUMBER[a]), n)
+
+    number_starts = run_starts[DIGIT[first]]
+    number_ends = non_number[np.searchsorted(non_number, number_starts)]
+    identifier_starts = np.concatenate((run_starts[WORD_START[first]],
+                                        number_ends[WORD_START[padded[number_ends]]]))
+    identifier_starts.sort()
+    identifier_ends = non_word[np.searchsorted(non_word, identifier_starts)]
+
+    errors = [np.flatnonzero(~VALID[a] & plain), run_starts[first == 46],
+              identifier_ends[padded[identifier_ends] == 46]]
+    errors = np.concatenate(errors)
+    if len(errors):
+        if lexer.recover:
+            return None  # ERROR tokens are left to the regex engine
+        _raise_error(lexer, a, int(errors.min()))
+
+    identifier_kinds = np.full(len(identifier_starts), IDENTIFIER, dtype=np.int64)
+    identifier_symbols = np.empty(len(identifier_starts), dtype=np.int64)
+    intern = lexer.symbols.intern
+    for i, (start, end) in enumerate(zip(identifier_starts.tolist(), identifier_ends.tolist())):
+        spelling = text[start:end]
+        identifier_symbols[i] = intern(spelling)
+        if spelling in KEYWORDS:
+            identifier_kinds[i] = KEYWORD
+
+    starts = np.concatenate((special_starts, punct_starts, number_starts, identifier_starts))
+    kinds = np.concatenate((special_kinds, punct_kinds,
+                            np.full(len(number_starts), TYPE_CODES['NUMBER'], dtype=np.int64),
+                            identifier_kinds))
+    value_starts = np.concatenate((special_value_starts, punct_starts, number_starts, identifier_starts))
+    value_ends = np.concatenate((special_value_ends, punct_starts + 1, number_ends, identifier_ends))
+    symbols = np.concatenate((np.full(len(special_starts), NO_SYMBOL, dtype=np.int64),
+                              PUNCT_SYMBOLS[a[punct_starts]],
+                              np.full(len(number_starts), NO_SYMBOL, dtype=np.int64),
+                              identifier_symbols))
+    order = np.argsort(starts, kind='stable')
+    return kinds[order], starts[order], value_starts[order], value_ends[order], symbols[order]
+
+
+def _positions(a, starts):
+    newlines = np.flatnonzero(a == 10)
+    line_index = np.searchsorted(newlines, starts, side='right')
+    line_starts = np.concatenate(([0], newlines + 1))[line_index]
+    return line_index + 1, starts - line_starts + 1
+
+
+def _raise_error(lexer, a, pos):
+    lines, columns = _positions(a, np.array([pos]))
+    lexer._seek(pos, int(lines[0]), int(columns[0]))
+    lexer.error()
+
+
+def tokenize(lexer):
+    text = lexer.text
+    if lexer.pos or not text.isascii():
+        return lexer._tokenize_regex()
+    result = scan(lexer)
+    if result is None:
+        return lexer._tokenize_regex()
+    kinds, starts, value_starts, value_ends, symbols = result
+    lexer.diagnostics = []
+    lines, columns = _positions(np.frombuffer(text.encode('ascii'), dtype=np.uint8), starts)
+    spellings = lexer.symbols.spellings
+    tokens = [{
+        'type': TOKEN_TYPES[kind],
+        'value': spellings[symbol] if symbol != NO_SYMBOL else text[value_start:value_end],
+        'line': line,
+        'column': column
+    } for kind, value_start, value_end, line, column, symbol in zip(
+        kinds.tolist(), value_starts.tolist(), value_ends.tolist(), lines.tolist(), columns.tolist(),
+        symbols.tolist())]
+    lexer._seek(len(text), text.count('\n') + 1, len(text) - text.rfind('\n'))
+    return tokens
+
+
+def tokenize_stream(lexer):
+    text = lexer.text
+    if lexer.pos or not text.isascii():
+        return lexer._tokenize_stream_regex()
+    result = scan(lexer)
+    if result is None:
+        return lexer._tokenize_stream_regex()
+    kinds, starts, value_starts, value_ends, symbols = result
+    lexer.diagnostics = []
+    lines, columns = _positions(np.frombuffer(text.encode('ascii'), dtype=np.uint8), starts)
+    stream = TokenStream(text, lexer.symbols)
+    for column, values in ((stream.kinds, kinds), (stream.starts, value_starts), (stream.ends, value_ends),
+                           (stream.lines, lines), (stream.columns, columns), (stream.symbols, symbols)):
+        column.frombytes(values.astype(np.dtype(column.typecode)).tobytes())
+    lexer._seek(len(text), text.count('\n') + 1, len(text) - text.rfind('\n'))
+    return stream
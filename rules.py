@@ -0,0 +1,195 @@
+import time
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, List
+
+# What a rule looks at: one line's tokens at a time, the whole token list,
+# or the parse tree.
+SCOPES = ('line', 'tokens', 'tree')
+# A source is in the first tier whose token limit it stays under.
+SIZE_TIERS = (('small', 20000), ('medium', 500000), ('large', None))
+TIERS = tuple(name for name, _ in SIZE_TIERS)
+
+
+def size_tier(token_count: int) -> str:
+    for name, limit in SIZE_TIERS:
+        if limit is None or token_count < limit:
+            return name
+
+
+class RuleStats:
+    """Number of runs of a rule, and their total and longest time."""
+
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def __repr__(self):
+        return f'RuleStats(count={self.count}, total={self.total:.6f}, max={self.max:.6f})'
+
+
+class Rule:
+    """A named check.
+
+    ``check`` is called with a line (for 'line' rules) or with the run's
+    Source ('tokens' and 'tree' rules) and returns diagnostics in
+    check_syntax() format. Under a time budget, rules of higher
+    ``priority`` run first. ``tiers`` are the size tiers the rule runs for.
+    """
+
+    def __init__(self, name: str, scope: str, check: Callable, priority: int = 0, tiers=TIERS):
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown rule scope '{scope}', expected one of {SCOPES}")
+        self.name = name
+        self.scope = scope
+        self.check = check
+        self.priority = priority
+        self.tiers = frozenset(tiers)
+        self.enabled = True
+        self.stats = RuleStats()
+
+    def __repr__(self):
+        return f'Rule({self.name!r}, {self.scope!r}, priority={self.priority})'
+
+
+class Source:
+    """What the rules of one run get: the tokens, the lines the line rules
+    go through (built on first use by ``line_builder``), and optionally the
+    caller's BracketIndex and parse tree. Building the lines is timed into
+    ``line_stats`` when it is set.
+
+    ``edit`` is ``(first, stop, head, tail, line_delta)`` when only
+    ``tokens[first:stop]`` changed since the registry's previous run over
+    them: line rule diagnostics up to line ``head`` still hold, and so do
+    those from line ``tail`` (None: none) on, which move by ``line_delta``.
+    """
+
+    def __init__(self, tokens, line_builder: Callable, brackets=None, tree=None, edit=None):
+        self.tokens = tokens
+        self.brackets = brackets
+        self.tree = tree
+        self.edit = edit
+        self.line_stats: RuleStats = None
+        self._line_builder = line_builder
+        self._lines = None
+        self._edited_lines = None
+
+    @property
+    def lines(self) -> List[Any]:
+        if self._lines is None:
+            start = time.perf_counter()
+            self._lines = self._line_builder(self.tokens)
+            if self.line_stats is not None:
+                self.line_stats.add(time.perf_counter() - start)
+        return self._lines
+
+    @property
+    def edited_lines(self) -> List[Any]:
+        """The lines of the edited tokens alone."""
+        if self._edited_lines is None:
+            start = time.perf_counter()
+            first, stop = self.edit[:2]
+            self._edited_lines = self._line_builder(self.tokens[first:stop])
+            if self.line_stats is not None:
+                self.line_stats.add(time.perf_counter() - start)
+        return self._edited_lines
+
+
+def _splice(errors, edited, head, tail, line_delta):
+    # ``errors`` (sorted by line) with those after line ``head`` and before
+    # line ``tail`` replaced by ``edited``, and those from ``tail`` on moved
+    # by ``line_delta``
+    lines = [error['line'] for error in errors]
+    kept = errors[:bisect_right(lines, head)]
+    if tail is None:
+        return kept + edited
+    rest = errors[bisect_left(lines, tail):]
+    if line_delta:
+        rest = [dict(error, line=error['line'] + line_delta) for error in rest]
+    return kept + edited + rest
+
+
+class RuleRegistry:
+    """Rules by name, reported in the order they were registered.
+
+    run() times every rule it runs into the rule's stats. With a budget it
+    stops starting rules once the run has taken that long, and lists the
+    rules it did not get to in ``skipped``. It keeps the diagnostics of the
+    line rules, so that a run over an edit only checks the edited lines.
+    """
+
+    def __init__(self):
+        self.rules: Dict[str, Rule] = {}
+        self._line_errors: Dict[str, List[Dict[str, Any]]] = {}  # line rule -> its last diagnostics
+        self.line_stats = RuleStats()  # building the lines for the line rules
+        self.skipped: List[str] = []   # rules the last run() skipped for its budget
+
+    def register(self, rule: Rule) -> Rule:
+        self.rules[rule.name] = rule
+        return rule
+
+    def enable(self, name: str, enabled: bool = True, tiers=None):
+        """Turns a rule on or off, and optionally sets its size tiers."""
+        rule = self.rules[name]
+        rule.enabled = enabled
+        if tiers is not None:
+            rule.tiers = frozenset(tiers)
+
+    def __getitem__(self, name: str) -> Rule:
+        return self.rules[name]
+
+    def __iter__(self):
+        return iter(self.rules.values())
+
+    def stats(self) -> Dict[str, RuleStats]:
+        return {name: rule.stats for name, rule in self.rules.items()}
+
+    def run(self, source: Source, budget: float = None, scopes=SCOPES) -> List[Dict[str, Any]]:
+        """Diagnostics of every rule of ``scopes`` that applies to
+        ``source``, by line and then in registration order. ``budget`` is
+        in seconds."""
+        started = time.perf_counter()
+        tier = size_tier(len(source.tokens))
+        source.line_stats = self.line_stats
+        self.skipped = []
+        found = {}
+        for rule in sorted(self.rules.values(), key=lambda rule: -rule.priority):
+            if rule.scope not in scopes:
+                continue
+            if not rule.enabled or tier not in rule.tiers or (rule.scope == 'tree' and source.tree is None):
+                self._line_errors.pop(rule.name, None)
+                continue
+            if budget is not None and time.perf_counter() - started > budget:
+                self._line_errors.pop(rule.name, None)
+                self.skipped.append(rule.name)
+                continue
+            if rule.scope == 'line':
+                # Only a rule that ran over the tokens before the edit can
+                # keep its other lines; one that missed a run goes over all.
+                cached = self._line_errors.get(rule.name) if source.edit is not None else None
+                # Built before the rule's clock starts; the time goes to line_stats
+                lines = source.lines if cached is None else source.edited_lines
+            start = time.perf_counter()
+            if rule.scope == 'line':
+                check = rule.check
+                errors = [error for line in lines for error in check(line)]
+                if cached is not None:
+                    errors = _splice(cached, errors, *source.edit[2:])
+                self._line_errors[rule.name] = errors
+            else:
+                errors = rule.check(source)
+            rule.stats.add(time.perf_counter() - start)
+            found[rule.name] = errors
+
+        result = []
+        for name in self.rules:
+            result.extend(found.get(name, ()))
+        result.sort(key=lambda error: error['line'])
+        return result
@@ -0,0 +1,46 @@
+from typing import Dict, List
+
+# Punctuation gets the same IDs in every table, so producers such as the
+# NumPy lexer can fill in its symbols without a lookup.
+PUNCTUATION = ('+', '-', '*', '/', '%', '=', '<', '>', '!', '&', '|', '^', '~',
+               '(', ')', '{', '}', '[', ']', ';', ',')
+PUNCTUATION_IDS = {spelling: symbol_id for symbol_id, spelling in enumerate(PUNCTUATION)}
+
+NO_SYMBOL = 0xFFFFFFFF  # 'I' array entry of tokens without a symbol
+
+
+class SymbolTable:
+    """Per-document table of interned token spellings.
+
+    Every distinct identifier, keyword or punctuation spelling is stored
+    once and gets a small integer ID, so tokens can share one string per
+    spelling and be compared by ID.
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = dict(PUNCTUATION_IDS)
+        self.spellings: List[str] = list(PUNCTUATION)
+
+    def intern(self, spelling: str) -> int:
+        symbol_id = self.ids.get(spelling)
+        if symbol_id is None:
+            symbol_id = self.ids[spelling] = len(self.spellings)
+            self.spellings.append(spelling)
+        return symbol_id
+
+    def canonical(self, spelling: str) -> str:
+        """The table's shared copy of ``spelling``, interning it if needed."""
+        return self.spellings[self.intern(spelling)]
+
+    def spelling(self, symbol_id: int) -> str:
+        return self.spellings[symbol_id]
+
+    def lookup(self, spelling: str) -> int:
+        """ID of ``spelling``, or NO_SYMBOL if it was never interned."""
+        return self.ids.get(spelling, NO_SYMBOL)
+
+    def __len__(self):
+        return len(self.spellings)
+
+    def __contains__(self, spelling):
+        return spelling in self.ids
@@ -0,0 +1,188 @@
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Tuple
+
+NODE_TYPES = (
+    'program', 'preprocessor', 'function_declarations', 'function_declaration',
+    'return_type', 'function_name', 'parameters', 'parameter', 'type', 'identifier',
+    'block', 'variable_declaration', 'initialization', 'arithmetic_operation', 'number',
+    'if_statement', 'condition', 'body', 'expression_statement', 'while_statement',
+    'for_statement', 'increment', 'function_call', 'string_literal',
+    'unary_operation', 'postfix_operation', 'subscript'
+)
+NODE_CODES = {name: code for code, name in enumerate(NODE_TYPES)}
+# Key under which a node's value appears in its dict view
+VALUE_KEYS = {'arithmetic_operation': 'operator', 'unary_operation': 'operator',
+              'postfix_operation': 'operator', 'function_call': 'function_name'}
+
+NO_NODE = -1    # end of a child list, or an empty one
+NO_CHILDREN = -2  # first_child of a node without a 'children' entry
+
+
+class AstArena:
+    """Parallel-array storage for the nodes of a parse tree.
+
+    A node is an index into ``kinds``, ``values``, ``first_child``,
+    ``next_sibling`` and ``token_starts``/``token_ends``, the span of tokens
+    it was parsed from. Values are the token strings themselves, so a node
+    costs about 30 bytes against some 400 for the equivalent nested dicts.
+
+    Spans of nodes below an anchor (a top-level function) are stored
+    relative to the anchor's first token, so that moving a whole function
+    only touches the anchor. NodeView resolves them to absolute spans.
+    """
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.values: List[Any] = []
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.token_starts = array('I')
+        self.token_ends = array('I')
+        self.anchors = set()
+
+    def add(self, kind: str, start: int, end: int, value=None, children=None) -> int:
+        """Appends a node and returns its index. ``children`` (node indices)
+        become its child list; None means the node has no 'children' entry."""
+        node = len(self.kinds)
+        self.kinds.append(NODE_CODES[kind])
+        self.values.append(value)
+        self.first_child.append(NO_CHILDREN)
+        self.next_sibling.append(NO_NODE)
+        self.token_starts.append(start)
+        self.token_ends.append(end)
+        if children is not None:
+            self.set_children(node, children)
+        return node
+
+    def set_children(self, node: int, children: List[int]):
+        next_sibling = self.next_sibling
+        for child, following in zip(children, children[1:]):
+            next_sibling[child] = following
+        if children:
+            next_sibling[children[-1]] = NO_NODE
+        self.first_child[node] = children[0] if children else NO_NODE
+
+    def children(self, node: int) -> List[int]:
+        result = []
+        child = self.first_child[node]
+        while child >= 0:
+            result.append(child)
+            child = self.next_sibling[child]
+        return result
+
+    def type(self, node: int) -> str:
+        return NODE_TYPES[self.kinds[node]]
+
+    def anchor(self, node: int, first_descendant: int):
+        """Makes ``node`` an anchor: the spans of the nodes added since
+        ``first_descendant`` (its subtree) become relative to its start."""
+        start = self.token_starts[node]
+        token_starts, token_ends = self.token_starts, self.token_ends
+        for descendant in range(first_descendant, node):
+            token_starts[descendant] -= start
+            token_ends[descendant] -= start
+        self.anchors.add(node)
+
+    def shift(self, node: int, delta: int):
+        """Moves an anchor (and with it its subtree) by ``delta`` tokens."""
+        self.token_starts[node] += delta
+        self.token_ends[node] += delta
+
+    def extend(self, other: 'AstArena', token_offset: int) -> int:
+        """Appends the nodes of ``other``, whose anchors move by
+        ``token_offset`` tokens, and returns the index its first node got.
+        Nodes outside any anchor keep their spans."""
+        offset = len(self.kinds)
+        self.kinds.extend(other.kinds)
+        self.values.extend(other.values)
+        self.first_child.extend(array('i', [node + offset if node >= 0 else node
+                                            for node in other.first_child]))
+        self.next_sibling.extend(array('i', [node + offset if node >= 0 else node
+                                             for node in other.next_sibling]))
+        self.token_starts.extend(other.token_starts)
+        self.token_ends.extend(other.token_ends)
+        for anchor in other.anchors:
+            self.anchors.add(anchor + offset)
+            self.shift(anchor + offset, token_offset)
+        return offset
+
+    def view(self, node: int) -> 'NodeView':
+        return NodeView(self, node)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def nbytes(self) -> int:
+        """Memory held by the node columns, excluding the shared values."""
+        return (sum(column.itemsize * len(column) for column in
+                    (self.kinds, self.first_child, self.next_sibling, self.token_starts, self.token_ends)) +
+                8 * len(self.values))
+
+
+class NodeView(Mapping):
+    """Read-only dict view of an arena node, in the shape the parser used
+    to build: ``{'type': ..., 'value': ..., 'children': [...]}``."""
+
+    __slots__ = ('arena', 'node', 'base')
+
+    def __init__(self, arena: AstArena, node: int, base: int = 0):
+        self.arena = arena
+        self.node = node
+        self.base = base  # start of the anchor above this node
+
+    @property
+    def type(self) -> str:
+        return NODE_TYPES[self.arena.kinds[self.node]]
+
+    @property
+    def span(self) -> Tuple[int, int]:
+        """Token range ``(start, stop)`` the node was parsed from."""
+        arena, node = self.arena, self.node
+        base = 0 if node in arena.anchors else self.base
+        return base + arena.token_starts[node], base + arena.token_ends[node]
+
+    def _value_key(self):
+        if self.arena.values[self.node] is None:
+            return None
+        return VALUE_KEYS.get(self.type, 'value')
+
+    def __getitem__(self, key):
+        arena, node = self.arena, self.node
+        if key == 'type':
+            return self.type
+        if key == 'children' and arena.first_child[node] != NO_CHILDREN:
+            base = arena.token_starts[node] if node in arena.anchors else self.base
+            return [NodeView(arena, child, base) for child in arena.children(node)]
+        if key == self._value_key():
+            return arena.values[node]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield 'type'
+        value_key = self._value_key()
+        if value_key is not None:
+            yield value_key
+        if self.arena.first_child[self.node] != NO_CHILDREN:
+            yield 'children'
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'NodeView({self.to_dict()!r})'
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Nested-dict copy of the subtree, built without recursion since
+        long expressions make deep trees."""
+        root = {}
+        stack = [(self, root)]
+        while stack:
+            view, result = stack.pop()
+            for key, value in view.items():
+                if key == 'children':
+                    result[key] = [{} for _ in value]
+                    stack.extend(zip(value, result[key]))
+                else:
+                    result[key] = value
+        return root